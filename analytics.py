@@ -0,0 +1,196 @@
+import math
+import warnings
+
+import numpy as np
+
+from cache import TTLCache
+from db import get_collection
+from series import ROLLUP_INTERVALS, doc_series, ohlc, unpack_rollup
+
+
+HOUR_MS = 3_600_000
+PERIODS_PER_YEAR = {"1h": 24 * 365, "4h": 6 * 365, "1d": 365}
+METRICS_CACHE_SIZE = 32  # Window combinations kept per matrix, e.g. from /api/analytics?windows=
+
+
+def _forward_fill(prices):
+    """Fill gaps in every column with the last known price, leading gaps stay NaN."""
+    rows = np.arange(prices.shape[0])[:, None]
+    last_known = np.where(np.isnan(prices), 0, rows)
+    np.maximum.accumulate(last_known, axis=0, out=last_known)
+    return prices[last_known, np.arange(prices.shape[1])]
+
+
+def _to_json(values):
+    """Float array to a list with NaN replaced by None, so it serializes to null."""
+    return [None if math.isnan(value) else value for value in np.asarray(values, dtype=float).tolist()]
+
+
+class PriceMatrix:
+    """
+    Close prices of all tracked coins aligned on one time grid (rows = buckets, columns = symbols)
+
+    Every metric is computed for all symbols at once with NumPy, never per coin.
+
+    Parameters:
+        timestamps (ndarray): Bucket start times in epoch ms, ascending
+        symbols (list): Column symbols
+        prices (ndarray): float64 matrix of shape (len(timestamps), len(symbols)), NaN where unknown
+        resolution (str): Rollup the matrix was built from
+    """
+
+    def __init__(self, timestamps, symbols, prices, resolution="1h"):
+        self.timestamps = timestamps
+        self.symbols = symbols
+        self.prices = prices
+        self.resolution = resolution
+        self.columns = {symbol: i for i, symbol in enumerate(symbols)}
+        # The matrix never changes, so computed metrics stay valid for its whole lifetime
+        self._metrics = TTLCache(max_entries=METRICS_CACHE_SIZE, ttl=math.inf, stale_ttl=0)
+
+    @classmethod
+    def load(cls, resolution="1h"):
+        """Build the matrix from the stored OHLC rollups in a single pass over price_history."""
+        collection = get_collection("price_history")
+        series, without_rollup = {}, []
+
+        def add(symbol, matrix):
+            if len(matrix):
+                series[symbol] = (matrix[:, 0].astype(np.int64), matrix[:, 4])
+
+        # Only the stored rollup is read, the raw series never leave the database for it
+        for doc in collection.find({}, {"symbol": 1, f"rollups.{resolution}": 1}):
+            blob = (doc.get("rollups") or {}).get(resolution)
+            if blob:
+                add(doc["symbol"], unpack_rollup(blob, resolution))
+            else:
+                without_rollup.append(doc["_id"])
+
+        # Records stored before rollups existed are bucketed on the fly
+        if without_rollup:
+            for doc in collection.find(
+                {"_id": {"$in": without_rollup}}, {"symbol": 1, "timestamps": 1, "prices": 1, "history": 1}
+            ):
+                add(doc["symbol"], ohlc(*doc_series(doc), ROLLUP_INTERVALS[resolution]))
+
+        symbols = sorted(series)
+        if not symbols:
+            return cls(np.empty(0, np.int64), [], np.empty((0, 0)), resolution)
+
+        # Buckets are aligned to the interval, so the union of their starts is the common grid
+        timestamps = np.unique(np.concatenate([ts for ts, _ in series.values()]))
+        prices = np.full((len(timestamps), len(symbols)), np.nan)
+        for column, symbol in enumerate(symbols):
+            ts, closes = series[symbol]
+            prices[np.searchsorted(timestamps, ts), column] = closes
+
+        return cls(timestamps, symbols, _forward_fill(prices), resolution)
+
+    def _window_start(self, window_ms):
+        """Row index of the first bucket inside the trailing window."""
+        if window_ms is None or not len(self.timestamps):
+            return 0
+        return int(np.searchsorted(self.timestamps, self.timestamps[-1] - window_ms))
+
+    def _log_returns(self, window_ms=None):
+        prices = self.prices[self._window_start(window_ms):]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.diff(np.log(prices), axis=0)
+
+    def returns(self, window_ms):
+        """Return over the trailing window for every symbol, in percent."""
+        start = self.prices[self._window_start(window_ms)]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (self.prices[-1] / start - 1) * 100
+
+    def volatility(self, window_ms=None):
+        """Annualized standard deviation of log returns over the trailing window, in percent."""
+        log_returns = self._log_returns(window_ms)
+        if len(log_returns) < 2:
+            return np.full(len(self.symbols), np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Columns without enough data give NaN
+            std = np.nanstd(log_returns, axis=0, ddof=1)
+        return std * math.sqrt(PERIODS_PER_YEAR[self.resolution]) * 100
+
+    def drawdown(self, window_ms=None):
+        """(maximum drawdown, current drawdown) over the trailing window, in percent."""
+        prices = self.prices[self._window_start(window_ms):]
+        running_max = np.fmax.accumulate(prices, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN columns give NaN
+            drawdowns = (1 - prices / running_max) * 100
+            return np.nanmax(drawdowns, axis=0), drawdowns[-1]
+
+    def correlation(self, symbols=None, window_ms=None, min_coverage=0.5):
+        """
+        Correlation matrix of log returns
+
+        Symbols with data for less than `min_coverage` of the window are left out, remaining
+        gaps count as a zero return.
+
+        Returns:
+            tuple: (symbols, correlation matrix)
+        """
+        columns = [self.columns[s] for s in symbols if s in self.columns] if symbols else list(range(len(self.symbols)))
+        log_returns = self._log_returns(window_ms)[:, columns]
+        if len(log_returns) < 2 or not columns:
+            return [], np.empty((0, 0))
+
+        coverage = np.mean(~np.isnan(log_returns), axis=0)
+        keep = coverage >= min_coverage
+        log_returns = np.nan_to_num(log_returns[:, keep])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = np.atleast_2d(np.corrcoef(log_returns, rowvar=False))
+        return [self.symbols[c] for c, kept in zip(columns, keep) if kept], matrix
+
+    def metrics(self, window_hours=(24, 168)):
+        """
+        Per-symbol metrics for the given trailing windows, computed once per window combination
+
+        The returned dict is shared between callers and must not be modified.
+
+        Returns:
+            dict: symbol -> {"return_24h": ..., "volatility_24h": ..., "max_drawdown_24h": ..., ...}
+        """
+        window_hours = tuple(window_hours)
+        return self._metrics.get(window_hours, lambda: self._compute_metrics(window_hours))
+
+    def _compute_metrics(self, window_hours):
+        results = {symbol: {} for symbol in self.symbols}
+        if not results:
+            return results
+
+        for hours in window_hours:
+            window_ms = hours * HOUR_MS
+            max_drawdown, current_drawdown = self.drawdown(window_ms)
+            columns = {
+                f"return_{hours}h": self.returns(window_ms),
+                f"volatility_{hours}h": self.volatility(window_ms),
+                f"max_drawdown_{hours}h": max_drawdown,
+            }
+            if hours == max(window_hours):
+                columns["drawdown"] = current_drawdown
+
+            for name, values in columns.items():
+                for symbol, value in zip(self.symbols, _to_json(values)):
+                    results[symbol][name] = value
+
+        return results
+
+
+# Extra columns merged into the coin rows of every market snapshot
+ROW_METRICS = {
+    "volatility_7d": "volatility_168h",
+    "max_drawdown_7d": "max_drawdown_168h",
+    "drawdown": "drawdown",
+}
+
+
+def add_row_metrics(coins, metrics):
+    """Add the ROW_METRICS columns to the coin rows, None for coins without history."""
+    for coin in coins:
+        symbol_metrics = metrics.get(coin["symbol"].upper(), {})
+        for column, metric in ROW_METRICS.items():
+            coin[column] = symbol_metrics.get(metric)
+    return coins
@@ -0,0 +1,37 @@
+"""
+Backfill price histories for the top cryptocurrencies
+
+    python backfill.py --limit 500 --workers 8 --state-file .backfill_state.json
+
+Interrupted runs continue where they stopped when started again with the same state file.
+"""
+import argparse
+import os
+
+from db import connect_mongoengine
+from logging_config import configure_logging
+from utils import TokenDashboard
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill price histories for the top cryptocurrencies")
+    parser.add_argument("--limit", type=int, default=500, help="Number of top coins to backfill")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent fetches (default BACKFILL_WORKERS or 8)")
+    parser.add_argument("--state-file", default=".backfill_state.json", help="Progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore the progress of a previous run")
+    args = parser.parse_args()
+
+    if args.restart and os.path.exists(args.state_file):
+        os.remove(args.state_file)
+
+    configure_logging()
+    connect_mongoengine()
+
+    successful, failed = TokenDashboard().initialize_price_history_data(
+        limit=args.limit, workers=args.workers, state_file=args.state_file
+    )
+    return 1 if failed and not successful else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+"""
+Local stand-in for the CoinGecko endpoints used by TokenDashboard
+
+    python benchmarks/fake_coingecko.py --port 8900 --latency-ms 80 --coins 2500 --rate-limit-ratio 0.05
+
+Point the app at it with COINGECKO_API_URL=http://127.0.0.1:8900/api/v3
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeCoinGecko:
+    """
+    Deterministic fake market data served over HTTP
+
+    Parameters:
+        coins (int): Number of coins the markets endpoint knows about
+        latency_ms (float): Delay added to every response
+        rate_limit_ratio (float): Fraction of requests answered with 429 and a Retry-After header
+        retry_after (int): Retry-After value in seconds for those 429 responses
+    """
+
+    def __init__(self, coins=500, latency_ms=50, rate_limit_ratio=0.0, retry_after=1, seed=42):
+        self.coins = coins
+        self.latency_ms = latency_ms
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def coin(self, rank):
+        price = 50_000 / rank
+        return {
+            "id": f"coin-{rank}",
+            "symbol": f"c{rank}",
+            "image": f"https://example.invalid/coin-{rank}.png",
+            "current_price": price,
+            "market_cap_rank": rank,
+            "market_cap": price * 1_000_000,
+            "total_volume": price * 50_000,
+            "price_change_percentage_24h": math.sin(rank) * 5,
+            "price_change_percentage_1h_in_currency": math.sin(rank * 2) * 1,
+            "price_change_percentage_7d_in_currency": math.sin(rank * 3) * 10,
+            "price_change_percentage_30d_in_currency": None if rank % 17 == 0 else math.sin(rank * 5) * 20,
+        }
+
+    def markets(self, query):
+        per_page = int(query.get("per_page", ["100"])[0])
+        page = int(query.get("page", ["1"])[0])
+        first = (page - 1) * per_page + 1
+        last = min(first + per_page - 1, self.coins)
+        return [self.coin(rank) for rank in range(first, last + 1)]
+
+    def market_chart_range(self, coin_id, query):
+        start = int(query.get("from", ["0"])[0])
+        end = int(query.get("to", [str(int(time.time()))])[0])
+        rank = int(coin_id.rsplit("-", 1)[-1]) if coin_id.rsplit("-", 1)[-1].isdigit() else 1
+        base = 50_000 / rank
+        step = 300 if end - start <= 86_400 else 3_600  # Same granularity rules as the real API
+        first = start - start % step + step
+        return {
+            "prices": [
+                [ts * 1000, base * (1 + 0.05 * math.sin(ts / 40_000 + rank))]
+                for ts in range(first, end + 1, step)
+            ]
+        }
+
+    def handle(self, path, query):
+        """Return (status, headers, body) for a request path."""
+        with self._lock:
+            self.requests += 1
+            throttle = self.random.random() < self.rate_limit_ratio
+            if throttle:
+                self.throttled += 1
+
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        if throttle:
+            return 429, {"Retry-After": str(self.retry_after)}, {"error": "rate limited"}
+
+        parts = [part for part in path.split("/") if part]
+        if parts[:3] == ["api", "v3", "coins"]:
+            parts = parts[3:]
+            if parts == ["markets"]:
+                return 200, {}, self.markets(query)
+            if len(parts) == 3 and parts[1:] == ["market_chart", "range"]:
+                return 200, {}, self.market_chart_range(parts[0], query)
+            if len(parts) == 1:
+                return 200, {}, {"id": parts[0], "categories": ["Layer 1 (L1)", "Smart Contract Platform"]}
+
+        return 404, {}, {"error": "not found"}
+
+    def start(self, host="127.0.0.1", port=0):
+        """Serve in a daemon thread, returns the API base URL."""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, headers, payload = fake.handle(url.path, parse_qs(url.query))
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}/api/v3"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local CoinGecko stand-in")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--coins", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    fake = FakeCoinGecko(args.coins, args.latency_ms, args.rate_limit_ratio, args.retry_after)
+    print(f"Serving on {fake.start(port=args.port)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
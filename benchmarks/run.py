@@ -0,0 +1,246 @@
+"""
+Offline benchmark suite
+
+    python benchmarks/run.py                      # local mongod, database crypto_tracker_bench
+    python benchmarks/run.py --in-memory          # mongomock, no MongoDB needed
+    python benchmarks/run.py --latency-ms 150 --rate-limit-ratio 0.05 --coins 1000
+
+Everything runs against a local fake CoinGecko server. Results are written to
+benchmarks/results/<timestamp>.json and compared with the previous run.
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from fake_coingecko import FakeCoinGecko
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples_ms):
+    return {
+        "runs": len(samples_ms),
+        "mean_ms": statistics.fmean(samples_ms),
+        "p50_ms": percentile(samples_ms, 50),
+        "max_ms": max(samples_ms),
+    }
+
+
+def timed(fn, repeat=1, setup=None):
+    """Wall time of fn() over `repeat` runs, setup() runs untimed before each one."""
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return summarize(samples)
+
+
+def load_test(app, paths, concurrency, total):
+    """Send `total` GETs over `paths` from `concurrency` threads, report throughput and latency."""
+    local = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def request(i):
+        nonlocal errors
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        started = time.perf_counter()
+        response = local.client.get(paths[i % len(paths)])
+        response.get_data()  # Streamed bodies are only produced when read
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(request, range(total)))
+    wall = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": total / wall,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return None
+
+
+def compare(results, threshold):
+    """Print the change against the previous results file, returns the names of regressed metrics."""
+    previous_files = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    if not previous_files:
+        print("No previous results to compare with")
+        return []
+
+    with open(previous_files[-1]) as f:
+        previous = json.load(f)["benchmarks"]
+    print(f"\nCompared with {os.path.basename(previous_files[-1])}:")
+
+    regressions = []
+    for name, current in results.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        for key in ("mean_ms", "p95_ms", "rps"):
+            if key not in current or not before.get(key):
+                continue
+            change = (current[key] - before[key]) / before[key] * 100
+            worse = change < -threshold if key == "rps" else change > threshold
+            marker = "  REGRESSION" if worse else ""
+            print(f"  {name:28} {key:8} {before[key]:10.1f} -> {current[key]:10.1f} ({change:+.1f}%){marker}")
+            if worse:
+                regressions.append(f"{name}.{key}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--coins", type=int, default=500, help="Coins known to the fake API")
+    parser.add_argument("--history-coins", type=int, default=100, help="Coins to ingest history and render charts for")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latency of every fake API response")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Fraction of fake API responses that are 429")
+    parser.add_argument("--in-memory", action="store_true", help="Use mongomock instead of a local MongoDB")
+    parser.add_argument("--mongodb-uri", default="mongodb://localhost:27017/crypto_tracker_bench")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Chart render processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients for the route benchmarks")
+    parser.add_argument("--requests", type=int, default=400, help="Requests per route benchmark")
+    parser.add_argument("--threshold", type=float, default=20, help="Regression threshold in percent")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    fake = FakeCoinGecko(args.coins, args.latency_ms, args.rate_limit_ratio)
+    per_page = 250
+    # Configuration is read at import time, so it has to be in place before the app modules load
+    os.environ.update({
+        "COINGECKO_API_URL": fake.start(),
+        "COINGECKO_PER_PAGE": str(per_page),
+        "COINGECKO_PAGES": str(math.ceil(args.coins / per_page)),
+        "COINGECKO_RATE_LIMIT": "1000000",
+        "COINGECKO_BURST": "1000",
+        "MONGODB_URI": "mongomock://localhost/crypto_tracker_bench" if args.in_memory else args.mongodb_uri,
+        "START_BACKGROUND": "0",
+    })
+    sys.path.insert(0, ROOT)
+
+    import server
+    from chart_pipeline import ChartRenderPipeline
+    from db import get_database
+    from utils import TokenDashboard
+
+    app = server.create_app(start_background=False)
+    database = get_database()
+
+    def reset_database():
+        for name in ("price_history", "charts", "charts.files", "charts.chunks"):
+            database.drop_collection(name)
+
+    reset_database()
+    results = {}
+
+    print("Benchmarking coingecko_top500...")
+    results["coingecko_top500"] = timed(lambda: TokenDashboard().coingecko_top500(), repeat=3)
+
+    dashboard = TokenDashboard()
+    dashboard.coingecko_top500()
+
+    print("Benchmarking history ingestion...")
+    results["history_ingest_cold"] = timed(
+        lambda: dashboard.initialize_price_history_data(limit=args.history_coins)
+    )
+    results["history_ingest_fresh"] = timed(
+        lambda: dashboard.initialize_price_history_data(limit=args.history_coins)
+    )
+
+    print("Benchmarking chart rendering...")
+    # A run that renders nothing is fast but measures nothing, it is counted as an error
+    rendered = []
+    results["plot_7d_chart"] = timed(
+        lambda: rendered.append(len(dashboard.plot_7d_chart(limit=args.history_coins))), repeat=3
+    )
+    results["plot_7d_chart"]["errors"] = rendered.count(0)
+    pipeline = ChartRenderPipeline(server.market_snapshot, limit=args.history_coins, workers=args.workers)
+    pipeline._get_executor()  # Spawning the pool is a one-off startup cost, keep it out of the timing
+    stored = []
+    results["chart_pipeline_cold"] = timed(lambda: stored.append(pipeline.run_once()))
+    results["chart_pipeline_cold"]["errors"] = stored.count(0)
+    results["chart_pipeline_unchanged"] = timed(pipeline.run_once)
+
+    print("Benchmarking routes...")
+    server.market_snapshot.refresh(wait=True)
+    symbols = [coin["symbol"].upper() for coin in dashboard.coingecko_data[:args.history_coins]]
+    results["route_index"] = load_test(app, ["/"], args.concurrency, args.requests)
+    results["route_chart"] = load_test(
+        app, [f"/chart/{symbol}" for symbol in symbols], args.concurrency, args.requests
+    )
+    results["route_price_chart"] = load_test(
+        app, [f"/api/price-chart/{symbol}" for symbol in symbols], args.concurrency, args.requests
+    )
+
+    fake.stop()
+    results["fake_api"] = {"requests": fake.requests, "throttled": fake.throttled}
+
+    print("\nResults:")
+    for name, values in results.items():
+        print(f"  {name:28} " + ", ".join(f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+                                          for key, value in values.items()))
+
+    failed = [name for name, values in results.items() if values.get("errors")]
+    if failed:
+        # Never let a broken run become the baseline of the next comparison
+        print(f"\nErrors in {', '.join(failed)}, results not saved")
+        return 1
+
+    regressions = compare(results, args.threshold)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, datetime.utcnow().strftime("%Y%m%dT%H%M%SZ") + ".json")
+    with open(path, "w") as f:
+        json.dump({
+            "created_at": datetime.utcnow().isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "arguments": vars(args),
+            "benchmarks": results,
+        }, f, indent=2)
+    print(f"\nSaved {path}")
+
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import counter
+
+
+logger = logging.getLogger(__name__)
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU for binary blobs, bounded by the total size of the stored values
+
+    Parameters:
+        max_bytes (int): Maximum total size of the cached values
+        ttl (int): Seconds after which an entry is treated as missing
+    """
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return  # Would evict everything else
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic(), value)
+            self.size += len(value)
+
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class TTLCache:
+    """
+    Thread-safe LRU with per-entry TTL and stale-while-revalidate
+
+    Entries younger than `ttl` are served as is. Entries up to `ttl + stale_ttl` old are still
+    served, while one background thread reloads them. Older or missing entries are loaded
+    by the caller.
+
+    Parameters:
+        max_entries (int): Maximum number of entries before the least recently used is evicted
+        ttl (int): Seconds an entry is fresh
+        stale_ttl (int): Extra seconds a stale entry may be served while it is refreshed
+    """
+
+    def __init__(self, max_entries, ttl, stale_ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() to (re)load it when needed."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry[0]
+
+                if age < self.ttl:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    return entry[1]
+
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    self._entries.move_to_end(key)
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                    return entry[1]
+
+            self.misses += 1
+
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def peek(self, key):
+        """Return the cached value regardless of its age without counting a lookup, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry else None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _refresh(self, key, loader):
+        try:
+            self.set(key, loader())
+        except Exception:
+            logger.exception("Error refreshing cache entry", extra={"key": repr(key)})
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Single-flight for upstream fetches, shared by the whole process
+_in_flight = {}  # (kind, key) -> Future of the fetch that is currently running
+_in_flight_lock = threading.Lock()
+
+COALESCED_FETCHES = counter(
+    "fetches_coalesced_total", "Fetches that joined an in-flight fetch of the same key", ("kind",)
+)
+
+
+def single_flight(key, fetch):
+    """
+    Run fetch() once per key at a time, concurrent callers wait for and share its result
+
+    The result (or exception) is not kept once the fetch finished, the next caller starts a new one.
+
+    Parameters:
+        key (tuple): (kind, id), e.g. ("history", "BTC"), the kind is used as metric label
+        fetch (callable): Does the actual work
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _in_flight[key] = future
+
+    if not leader:
+        COALESCED_FETCHES.inc(kind=key[0])
+        return future.result()
+
+    try:
+        future.set_result(fetch())
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+    return future.result()
@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from cache import TTLCache, single_flight
+from coordination import get_coordinator
+from db import get_collection
+from http_client import RateLimiter
+from utils import TokenDashboard
+
+
+logger = logging.getLogger(__name__)
+
+
+class CategoriesUnavailable(Exception):
+    """Nothing stored for the coin and CoinGecko could not be reached."""
+
+
+class CategoryService:
+    """
+    CoinGecko categories (sectors) per coin, for the hover tooltips of the dashboard
+
+    The coin endpoint only takes one id per request, so every result is kept in the
+    `coin_categories` collection for a long time and in a small in-memory LRU in front of it.
+    Concurrent lookups of one coin share a single upstream request, a failed request is not
+    retried for `retry_after` seconds. A background thread on the worker holding the
+    background lease prefetches the top coins with a small share of the rate budget, so
+    hovers are nearly always served from the cache.
+
+    Parameters:
+        snapshot_store (MarketSnapshotStore): Source of the symbol-to-id mapping and the coin ranking
+        ttl (int): Seconds a stored category list is fresh (env CATEGORY_TTL, default 7 days)
+        prefetch_limit (int): Number of top coins kept prefetched (env CATEGORY_PREFETCH_LIMIT, default 100)
+        prefetch_rate (float): Requests per minute the prefetch may use (env CATEGORY_PREFETCH_RATE, default 6)
+        prefetch_interval (int): Seconds between prefetch passes (env CATEGORY_PREFETCH_INTERVAL, default 3600)
+    """
+
+    def __init__(self, snapshot_store, ttl=None, prefetch_limit=None, prefetch_rate=None, prefetch_interval=None):
+        self.snapshot_store = snapshot_store
+        self.ttl = ttl or int(os.getenv("CATEGORY_TTL", 7 * 24 * 3600))
+        self.prefetch_limit = prefetch_limit or int(os.getenv("CATEGORY_PREFETCH_LIMIT", 100))
+        self.prefetch_interval = prefetch_interval or int(os.getenv("CATEGORY_PREFETCH_INTERVAL", 3600))
+        self.retry_after = int(os.getenv("CATEGORY_RETRY_AFTER", 60))
+        # Applied on top of the shared CoinGecko limiter, leaves the rest of the budget to page views
+        self.prefetch_limiter = RateLimiter(
+            rate=prefetch_rate or float(os.getenv("CATEGORY_PREFETCH_RATE", 6)), burst=1
+        )
+        # coin id -> category list, re-read from MongoDB every few minutes to see other workers' fetches
+        self.cache = TTLCache(
+            max_entries=int(os.getenv("CATEGORY_CACHE_SIZE", 2000)),
+            ttl=int(os.getenv("CATEGORY_CACHE_TTL", 600)),
+            stale_ttl=self.ttl,
+        )
+        self._failed = {}  # coin id -> monotonic time of the last failed fetch
+        self._thread = None
+
+    def _coin_id(self, symbol):
+        return self.snapshot_store.get().symbol_to_id_map.get(symbol.upper())
+
+    def _is_fresh(self, doc):
+        return doc["fetched_at"] > datetime.utcnow() - timedelta(seconds=self.ttl)
+
+    def get(self, symbol):
+        """
+        Categories of one coin, fetched from CoinGecko when nothing fresh is stored
+
+        Returns:
+            list: Category names, None for a symbol that is not in the market snapshot
+
+        Raises:
+            CategoriesUnavailable: Nothing stored and the upstream request failed
+        """
+        coin_id = self._coin_id(symbol)
+        if coin_id is None:
+            return None
+        return self.cache.get(coin_id, lambda: self._load(coin_id, symbol.upper()))
+
+    def get_many(self, symbols):
+        """
+        Categories of several coins, from the caches only (one MongoDB query for the misses)
+
+        Returns:
+            dict: symbol -> category list, None where nothing is stored yet
+        """
+        coin_ids = self.snapshot_store.get().symbol_to_id_map
+        results, missing = {}, {}
+
+        for symbol in symbols:
+            coin_id = coin_ids.get(symbol.upper())
+            cached = self.cache.peek(coin_id) if coin_id else None
+            results[symbol] = cached
+            if coin_id and cached is None:
+                missing[coin_id] = symbol
+
+        if missing:
+            for doc in get_collection("coin_categories").find({"_id": {"$in": list(missing)}}):
+                self.cache.set(doc["_id"], doc["categories"])
+                results[missing[doc["_id"]]] = doc["categories"]
+
+        return results
+
+    def _load(self, coin_id, symbol):
+        doc = get_collection("coin_categories").find_one({"_id": coin_id})
+        if doc and self._is_fresh(doc):
+            return doc["categories"]
+
+        try:
+            return single_flight(("categories", coin_id), lambda: self._fetch(coin_id, symbol))
+        except CategoriesUnavailable:
+            if doc:
+                return doc["categories"]  # Outdated categories beat none
+            raise
+
+    def _fetch(self, coin_id, symbol):
+        """Request the categories from CoinGecko and store them, raises CategoriesUnavailable on failure."""
+        failed_at = self._failed.get(coin_id)
+        if failed_at and time.monotonic() - failed_at < self.retry_after:
+            raise CategoriesUnavailable(coin_id)
+
+        # Across worker processes a per-coin lease takes the place of single_flight()
+        with get_coordinator().lease(f"categories:{coin_id}", ttl=30) as acquired:
+            if not acquired:
+                raise CategoriesUnavailable(coin_id)  # Another worker is fetching it right now
+            categories = TokenDashboard().fetch_categories_by_id(coin_id)
+        if categories is None:
+            self._failed[coin_id] = time.monotonic()
+            raise CategoriesUnavailable(coin_id)
+
+        self._failed.pop(coin_id, None)
+        get_collection("coin_categories").update_one(
+            {"_id": coin_id},
+            {"$set": {"symbol": symbol, "categories": categories, "fetched_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        return categories
+
+    def prefetch(self):
+        """Fetch the categories of the top coins that have none or outdated ones, returns the number fetched."""
+        top = {}
+        for symbol, coin_id in self.snapshot_store.get().symbol_to_id_map.items():
+            if len(top) >= self.prefetch_limit:
+                break
+            top.setdefault(coin_id, symbol)  # The mapping is in market cap order
+
+        cutoff = datetime.utcnow() - timedelta(seconds=self.ttl)
+        fresh = {
+            doc["_id"] for doc in get_collection("coin_categories").find(
+                {"_id": {"$in": list(top)}, "fetched_at": {"$gt": cutoff}}, {"_id": 1}
+            )
+        }
+
+        fetched = 0
+        for coin_id, symbol in top.items():
+            if coin_id in fresh:
+                continue
+
+            self.prefetch_limiter.acquire()
+            try:
+                self.cache.set(coin_id, single_flight(("categories", coin_id), lambda: self._fetch(coin_id, symbol)))
+                fetched += 1
+            except CategoriesUnavailable:
+                pass
+
+        logger.info("Category prefetch completed", extra={"fetched": fetched, "fresh": len(fresh)})
+        return fetched
+
+    def start(self):
+        """Keep the categories of the top coins prefetched in a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    if get_coordinator().is_leader():
+                        self.prefetch()
+                except Exception:
+                    logger.exception("Error prefetching categories")
+                time.sleep(self.prefetch_interval)
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from chart_store import get_chart_store
+from coordination import get_coordinator
+from metrics import CHART_RENDER_SECONDS, CHARTS_RENDERED
+from series import pack_series
+from sparkline import render_history
+from utils import TokenDashboard, iter_sparklines, top_symbols
+
+
+logger = logging.getLogger(__name__)
+
+
+def history_digest(timestamps_blob, prices_blob, fmt):
+    """Digest of the points a chart is drawn from, a chart only needs redrawing when this changes."""
+    digest = hashlib.blake2b(fmt.encode(), digest_size=16)
+    digest.update(timestamps_blob)
+    digest.update(prices_blob)
+    return digest.hexdigest()
+
+
+class ChartRenderPipeline:
+    """
+    Renders the 7d thumbnail charts off the request path
+
+    A daemon thread renders the charts of all tracked symbols in a process pool every
+    `interval` seconds, or earlier when trigger() is called after new price history came in.
+    Every stored chart is tagged with the digest of the history it was drawn from, only symbols
+    whose digest changed are rendered again. Results go to the ChartStore, /chart/<ticker>
+    serves them. With several workers only the holder of the background lease renders.
+
+    Parameters:
+        snapshot_store (MarketSnapshotStore): Source of the tracked coins, rendered in market cap order
+        limit (int): Number of top coins to render (env CHART_RENDER_LIMIT, default 500)
+        workers (int): Size of the process pool (env CHART_RENDER_WORKERS, default CPU count)
+        interval (int): Seconds between scheduled runs (env CHART_RENDER_INTERVAL, default 900)
+        fmt (str): "png" or "svg" (env CHART_FORMAT, default png)
+    """
+
+    def __init__(self, snapshot_store, limit=None, workers=None, interval=None, fmt=None):
+        self.snapshot_store = snapshot_store
+        self.limit = limit or int(os.getenv("CHART_RENDER_LIMIT", 500))
+        self.workers = workers or int(os.getenv("CHART_RENDER_WORKERS", os.cpu_count() or 1))
+        self.interval = interval or int(os.getenv("CHART_RENDER_INTERVAL", 900))
+        self.fmt = fmt or os.getenv("CHART_FORMAT", "png")
+        self._executor = None
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _get_executor(self):
+        # Spawned workers only import the sparkline module, forking a threaded server is unsafe
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def load_jobs(self):
+        """Read the histories whose chart is missing or outdated."""
+        stored_digests = get_chart_store().digests()
+
+        jobs, digests = [], {}
+        symbols = top_symbols(self.snapshot_store.get_coins(), self.limit)
+        for symbol, timestamps, prices in iter_sparklines(symbols):
+            # Jobs carry the packed LTTB sparkline series, they are cheap to pickle to the workers
+            timestamps_blob, prices_blob = pack_series(timestamps, prices)
+            digest = history_digest(timestamps_blob, prices_blob, self.fmt)
+            if digest != stored_digests.get(symbol):
+                jobs.append((symbol, timestamps_blob, prices_blob, self.fmt))
+                digests[symbol] = digest
+        return jobs, digests
+
+    def run_once(self):
+        """Render the changed charts and store them, returns the number of charts stored."""
+        with CHART_RENDER_SECONDS.time():
+            jobs, digests = self.load_jobs()
+            if not jobs:
+                logger.debug("All charts are up to date")
+                return 0
+
+            chunksize = max(1, len(jobs) // (self.workers * 4))
+            chart_data = {
+                symbol: image_data
+                for symbol, image_data in self._get_executor().map(render_history, jobs, chunksize=chunksize)
+                if image_data
+            }
+
+            stored = TokenDashboard().store_charts_in_mongodb(chart_data, digests)
+
+        CHARTS_RENDERED.inc(len(chart_data))
+        logger.info("Charts rendered", extra={"jobs": len(jobs), "rendered": len(chart_data), "stored": stored})
+        return stored
+
+    def trigger(self):
+        """Ask for a render as soon as possible, e.g. after price histories were updated."""
+        self._wakeup.set()
+
+    def start(self):
+        """Start the scheduled render loop in a daemon thread."""
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                try:
+                    if get_coordinator().is_leader():
+                        self.run_once()
+                except Exception:
+                    logger.exception("Error rendering charts")
+
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
@@ -0,0 +1,150 @@
+import logging
+import sys
+import threading
+from datetime import datetime
+
+from gridfs import GridFSBucket
+from gridfs.errors import NoFile
+from pymongo import UpdateOne
+
+from db import get_collection, get_database
+from logging_config import configure_logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChartStore:
+    """
+    Chart images kept out of the price_history documents
+
+    The encoded images live in the `charts` GridFS bucket, one file per symbol and version
+    (the digest of the history it was drawn from). The small `charts` collection points every
+    symbol to its current file, so loading a PriceHistory never pulls image data.
+    """
+
+    def __init__(self):
+        self.bucket = GridFSBucket(get_database(), bucket_name="charts")
+        self.index = get_collection("charts")
+
+    def ensure_indexes(self):
+        self.index.create_index("symbol", unique=True)
+
+    def digests(self):
+        """Return symbol -> digest of the chart currently stored for it."""
+        return {
+            doc["symbol"]: doc.get("digest")
+            for doc in self.index.find({}, {"_id": 0, "symbol": 1, "digest": 1})
+        }
+
+    def get_meta(self, symbol):
+        """Return the pointer document for a symbol (file_id, format, digest, updated_at), or None."""
+        return self.index.find_one({"symbol": symbol.upper()}, {"_id": 0})
+
+    def read(self, file_id):
+        """Image bytes of a stored version, None when it was replaced and deleted in the meantime."""
+        try:
+            return self.bucket.open_download_stream(file_id).read()
+        except NoFile:
+            return None
+
+    def put_many(self, chart_data, digests=None):
+        """
+        Upload new chart versions and point the symbols to them
+
+        Parameters:
+            chart_data (dict): Symbol -> encoded image bytes
+            digests (dict): Optional symbol -> digest of the history each chart was drawn from
+
+        Returns:
+            int: Number of charts stored
+        """
+        if not chart_data:
+            return 0
+
+        digests = digests or {}
+        now = datetime.utcnow()
+        previous = {
+            doc["symbol"]: doc["file_id"]
+            for doc in self.index.find(
+                {"symbol": {"$in": [ticker.upper() for ticker in chart_data]}},
+                {"_id": 0, "symbol": 1, "file_id": 1},
+            )
+        }
+        operations = []
+
+        for ticker, image_data in chart_data.items():
+            symbol = ticker.upper()
+            chart_format = "svg" if image_data.startswith(b"<svg") else "png"
+            digest = digests.get(ticker)
+            file_id = self.bucket.upload_from_stream(
+                f"{symbol}/{digest or now.timestamp()}.{chart_format}",
+                image_data,
+                metadata={"symbol": symbol, "format": chart_format, "digest": digest},
+            )
+            operations.append(UpdateOne(
+                {"symbol": symbol},
+                {"$set": {
+                    "file_id": file_id,
+                    "format": chart_format,
+                    "digest": digest,
+                    "length": len(image_data),
+                    "updated_at": now,
+                }},
+                upsert=True,
+            ))
+
+        self.index.bulk_write(operations, ordered=False)
+
+        # Old versions are only removed once nothing points to them anymore
+        for file_id in previous.values():
+            self.bucket.delete(file_id)
+
+        logger.debug("Charts stored", extra={"count": len(operations)})
+        return len(operations)
+
+    def migrate_embedded_charts(self):
+        """Move chart_image blobs embedded in price_history documents into the bucket."""
+        price_history = get_collection("price_history")
+        migrated = 0
+
+        for doc in price_history.find(
+            {"chart_image": {"$exists": True}},
+            {"symbol": 1, "chart_image": 1, "chart_digest": 1},
+        ):
+            self.put_many({doc["symbol"]: doc["chart_image"]}, {doc["symbol"]: doc.get("chart_digest")})
+            price_history.update_one(
+                {"_id": doc["_id"]},
+                {"$unset": {"chart_image": "", "chart_format": "", "chart_updated_at": "", "chart_digest": ""}},
+            )
+            migrated += 1
+
+        logger.info("Migrated embedded charts", extra={"count": migrated})
+        return migrated
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chart_store():
+    """Return the process-wide ChartStore, created (and connected) on first use."""
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ChartStore()
+
+    return _store
+
+
+if __name__ == "__main__":
+    # python chart_store.py migrate
+    if sys.argv[1:] == ["migrate"]:
+        configure_logging()
+        store = ChartStore()
+        store.ensure_indexes()
+        store.migrate_embedded_charts()
+    else:
+        print("Usage: python chart_store.py migrate")
@@ -0,0 +1,106 @@
+class CoinIndex:
+    """
+    Lookup structures for one market snapshot, built once when the snapshot is refreshed
+
+    - symbol/name hash maps for direct lookups
+    - a prefix index for the search box
+    - presorted orderings for every sortable column
+
+    Parameters:
+        coins (list): Row dicts as returned by TokenDashboard.coingecko_top500
+    """
+
+    # Query sort key -> row field
+    SORT_FIELDS = {
+        "rank": "market_cap_rank",
+        "price": "current_price",
+        "market_cap": "market_cap",
+        "volume": "total_volume",
+        "change_1h": "price_change_percentage_1h",
+        "change_24h": "price_change_percentage_24",
+        "change_7d": "price_change_percentage_7d",
+        "change_30d": "price_change_percentage_30d",
+    }
+
+    MAX_PREFIX = 8  # Longer queries are filtered from the candidates of their first 8 characters
+
+    def __init__(self, coins):
+        self.coins = coins
+        self.by_symbol = {}
+        self.by_name = {}
+        self.prefixes = {}
+        self.orderings = {}
+        self.positions = {}
+
+        for i, coin in enumerate(coins):
+            # First one wins, so duplicated tickers resolve to the highest ranked coin
+            self.by_symbol.setdefault(coin["symbol"].upper(), coin)
+            self.by_name.setdefault(coin["id"].lower(), coin)
+
+            for term in self._search_terms(coin):
+                for length in range(1, min(len(term), self.MAX_PREFIX) + 1):
+                    self.prefixes.setdefault(term[:length], set()).add(i)
+
+        for key, field in self.SORT_FIELDS.items():
+            # Coins without a value (e.g. no market cap rank) sort last in both directions
+            present = [i for i in range(len(coins)) if coins[i][field] is not None]
+            missing = [i for i in range(len(coins)) if coins[i][field] is None]
+            ascending = sorted(present, key=lambda i: coins[i][field])
+
+            for order, ordering in (("asc", ascending + missing), ("desc", ascending[::-1] + missing)):
+                self.orderings[key, order] = ordering
+                self.positions[key, order] = {i: pos for pos, i in enumerate(ordering)}
+
+    @staticmethod
+    def _search_terms(coin):
+        name = coin["id"].lower()
+        return {coin["symbol"].lower(), name, *name.split()}
+
+    def get(self, symbol):
+        """Return the row for a ticker, or None."""
+        return self.by_symbol.get(symbol.upper())
+
+    def search(self, q):
+        """Return the set of row positions whose symbol or name starts with q."""
+        q = q.strip().lower()
+        candidates = self.prefixes.get(q[: self.MAX_PREFIX], set())
+
+        if len(q) > self.MAX_PREFIX:
+            candidates = {
+                i for i in candidates
+                if any(term.startswith(q) for term in self._search_terms(self.coins[i]))
+            }
+
+        return candidates
+
+    def query(self, q="", sort="rank", order="asc", offset=0, limit=50):
+        """
+        Return one page of coins
+
+        Parameters:
+            q (str): Optional symbol/name prefix
+            sort (str): One of SORT_FIELDS
+            order (str): "asc" or "desc"
+            offset (int): Number of matching rows to skip
+            limit (int): Maximum number of rows to return
+
+        Returns:
+            tuple: (total number of matches, list of row dicts)
+        """
+        if sort not in self.SORT_FIELDS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unknown sort order: {order}")
+
+        if q:
+            # Only the matches get sorted, never the whole table
+            positions = self.positions[sort, order]
+            matches = sorted(self.search(q), key=positions.__getitem__)
+            total = len(matches)
+            page = matches[offset:offset + limit]
+        else:
+            ordering = self.orderings[sort, order]
+            total = len(ordering)
+            page = ordering[offset:offset + limit]
+
+        return total, [self.coins[i] for i in page]
@@ -0,0 +1,174 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+
+logger = logging.getLogger(__name__)
+
+# Lease held by the worker that does the upstream and render work for every worker
+BACKGROUND_LEASE = "background-jobs"
+
+
+class MongoBackend:
+    """
+    Leases and shared values in MongoDB, visible to every worker process and host
+
+    A lease is a `leases` document {_id: name, owner, expires_at}. It is taken with a single
+    conditional upsert: the filter only matches when the lease is ours or expired, when it is
+    held by someone else the upsert collides on _id and fails.
+
+    pymongo is imported on first use, so the local backend works without it.
+    """
+
+    def acquire(self, name, owner, ttl):
+        from pymongo import ReturnDocument
+        from pymongo.errors import DuplicateKeyError
+
+        from db import get_collection
+
+        now = datetime.utcnow()
+        try:
+            get_collection("leases").find_one_and_update(
+                {"_id": name, "$or": [{"owner": owner}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    def release(self, name, owner):
+        from db import get_collection
+
+        get_collection("leases").delete_one({"_id": name, "owner": owner})
+
+    def get(self, key):
+        from db import get_collection
+
+        doc = get_collection("shared_state").find_one({"_id": key})
+        return doc["value"] if doc else None
+
+    def set(self, key, value):
+        from db import get_collection
+
+        get_collection("shared_state").replace_one(
+            {"_id": key}, {"_id": key, "value": value, "updated_at": datetime.utcnow()}, upsert=True
+        )
+
+
+class LocalBackend:
+    """In-process stand-in for MongoBackend, for a single worker, tests and benchmarks."""
+
+    def __init__(self):
+        self._leases = {}  # name -> (owner, monotonic expiry)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, owner, ttl):
+        with self._lock:
+            holder, expires_at = self._leases.get(name, (None, 0.0))
+            now = time.monotonic()
+            if holder not in (None, owner) and expires_at > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release(self, name, owner):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        self._values[key] = value
+
+
+BACKENDS = {"mongo": MongoBackend, "local": LocalBackend}
+
+
+class Coordinator:
+    """
+    State shared by all worker processes of the dashboard
+
+    Leases elect the one worker that talks to CoinGecko and renders charts, shared values
+    hand its results to the others. A lease is held until it expires or is released, the
+    holder renews it by acquiring it again.
+
+    Parameters:
+        backend (str): "mongo" or "local" (env COORDINATION_BACKEND, default mongo)
+        lease_ttl (int): Default lease lifetime in seconds (env LEASE_TTL, default 180)
+    """
+
+    def __init__(self, backend=None, lease_ttl=None):
+        backend = backend or os.getenv("COORDINATION_BACKEND", "mongo")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown coordination backend: {backend}")
+
+        self.backend = BACKENDS[backend]()
+        self.lease_ttl = lease_ttl or int(os.getenv("LEASE_TTL", 180))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._leader = False
+
+    def acquire(self, name, ttl=None):
+        """Take or renew a lease, returns whether this worker holds it."""
+        try:
+            return self.backend.acquire(name, self.owner, ttl or self.lease_ttl)
+        except Exception:
+            logger.exception("Error acquiring lease", extra={"lease": name})
+            return False
+
+    def release(self, name):
+        try:
+            self.backend.release(name, self.owner)
+        except Exception:
+            logger.exception("Error releasing lease", extra={"lease": name})
+
+    @contextmanager
+    def lease(self, name, ttl=None):
+        """Hold a lease for the duration of the block, yields whether it was acquired."""
+        acquired = self.acquire(name, ttl)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(name)
+
+    def is_leader(self):
+        """Take or renew the background lease, True on the worker that should do the shared work."""
+        leader = self.acquire(BACKGROUND_LEASE)
+        if leader != self._leader:
+            logger.info("Background leadership changed", extra={"leader": leader, "owner": self.owner})
+            self._leader = leader
+        return leader
+
+    def get(self, key):
+        """Shared value stored under key, None when missing."""
+        return self.backend.get(key)
+
+    def set(self, key, value):
+        """Publish a value to every worker, it has to be BSON serializable for the mongo backend."""
+        self.backend.set(key, value)
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator():
+    """Return the process-wide Coordinator."""
+    global _coordinator
+
+    if _coordinator is None:
+        with _coordinator_lock:
+            if _coordinator is None:
+                _coordinator = Coordinator()
+
+    return _coordinator
@@ -0,0 +1,93 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+from mongoengine import connect
+from pymongo import MongoClient, monitoring
+
+from metrics import MONGO_SECONDS
+
+
+load_dotenv()
+
+DEFAULT_MONGODB_URI = "mongodb://localhost:27017/crypto_tracker"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Records the duration of every MongoDB command (find, insert, update, getMore, ...)."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        MONGO_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+
+
+def _event_listeners():
+    # mongomock does not emit command events
+    return [] if mongodb_uri().startswith("mongomock://") else [CommandTimer()]
+
+
+def mongodb_uri():
+    """MONGODB_URI, a mongomock:// URI selects an in-memory database (needs the mongomock package)."""
+    return os.getenv("MONGODB_URI", DEFAULT_MONGODB_URI)
+
+
+def _client_class():
+    if mongodb_uri().startswith("mongomock://"):
+        import mongomock
+        import mongomock.gridfs
+
+        mongomock.gridfs.enable_gridfs_integration()
+        return mongomock.MongoClient
+    return MongoClient
+
+
+def _client_uri():
+    uri = mongodb_uri()
+    return "mongodb://" + uri[len("mongomock://"):] if uri.startswith("mongomock://") else uri
+
+
+def get_mongo_client():
+    """Return the process-wide MongoClient, it is thread-safe and keeps its own connection pool."""
+    global _client
+
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _client_class()(
+                    _client_uri(),
+                    maxPoolSize=int(os.getenv("MONGODB_POOL_SIZE", 50)),
+                    event_listeners=_event_listeners(),
+                )
+
+    return _client
+
+
+def get_database():
+    """The database named in MONGODB_URI, crypto_tracker when the URI has none."""
+    return get_mongo_client().get_default_database(default="crypto_tracker")
+
+
+def get_collection(name):
+    """Shortcut for a collection of the application database."""
+    return get_database()[name]
+
+
+def connect_mongoengine():
+    """
+    Connect the mongoengine models to the same database as get_mongo_client()
+
+    mongoengine is handed the process-wide client instead of building its own, with two
+    mongomock clients the models and the raw collections would not see each other's writes.
+    The database name is resolved once by get_database(), for a URI without one mongoengine
+    would otherwise fall back to "test".
+    """
+    client = get_mongo_client()
+    return connect(db=get_database().name, host=_client_uri(), mongo_client_class=lambda **settings: client)
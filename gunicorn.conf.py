@@ -0,0 +1,22 @@
+"""
+Gunicorn settings for the dashboard
+
+    gunicorn -c gunicorn.conf.py "server:create_app()"
+
+/api/stream keeps a request open per connected dashboard, so the workers have to be threaded
+(or gevent). With sync workers every open dashboard pins a whole worker and the regular API
+starves. Keep SSE_MAX_CLIENTS well below the thread count so streams cannot take all threads.
+"""
+import os
+
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")  # "gevent" works as well
+threads = int(os.getenv("GUNICORN_THREADS", 50))
+
+# Streams are closed by the app after SSE_MAX_DURATION, the timeout only has to cover slow requests
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+
+# No preload: every worker creates its MongoClient and background threads after the fork
+preload_app = False
@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from metrics import UPSTREAM_RATE_LIMITED, UPSTREAM_REQUESTS, UPSTREAM_SECONDS
+
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Overridable so benchmarks and tests can point at a local stand-in
+COINGECKO_API_URL = os.getenv("COINGECKO_API_URL", "https://api.coingecko.com/api/v3").rstrip("/")
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread that talks to the same API
+
+    The rate adapts to the server: a 429 pauses every caller for the Retry-After period and
+    halves the rate, each successful request then slowly raises it back to the configured one.
+
+    Parameters:
+        rate (float): Requests allowed per minute
+        burst (int): How many requests may be sent back to back before throttling kicks in
+    """
+
+    def __init__(self, rate, burst):
+        self.max_rate = rate / 60.0  # Tokens per second
+        self.rate = self.max_rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.throttled = 0  # Number of 429 responses seen
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def backoff(self, retry_after=None):
+        """Called on a 429, pauses all callers and halves the rate."""
+        with self._lock:
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + (retry_after or 1 / self.rate))
+            self.rate = max(self.rate / 2, self.max_rate / 16)
+            self.tokens = 0.0
+            self.updated = self.blocked_until
+            self.throttled += 1
+
+    def success(self):
+        """Called after a successful request, additive increase back to the configured rate."""
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+# Budget for the CoinGecko API plan (the demo plan allows 30 calls per minute)
+coingecko_limiter = RateLimiter(
+    rate=float(os.getenv("COINGECKO_RATE_LIMIT", 30)),
+    burst=int(os.getenv("COINGECKO_BURST", 10)),
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide requests session, keeps TLS connections to CoinGecko alive between calls."""
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                pool_size = int(os.getenv("HTTP_POOL_SIZE", 10))
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+
+    return _session
+
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header given in seconds, None when missing or an HTTP date."""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def endpoint_label(url):
+    """Metric label for a CoinGecko URL, ids in the path are replaced so the label set stays small."""
+    parts = urlsplit(url).path.rstrip("/").split("/")
+    if "coins" not in parts:
+        return parts[-1]
+    parts = parts[parts.index("coins") + 1:]
+    if not parts or parts[0] == "markets":
+        return "coins/markets"
+    return "/".join(["coins", "{id}"] + parts[1:])
+
+
+def coingecko_get(url, headers, params=None, retries=3, timeout=15):
+    """
+    GET a CoinGecko endpoint within the shared rate budget
+
+    429 responses are retried after the Retry-After period, up to `retries` times. The last
+    response is returned as is, connection errors are raised.
+    """
+    endpoint = endpoint_label(url)
+
+    for attempt in range(retries + 1):
+        coingecko_limiter.acquire()
+        # Timed after acquire() so waiting for the rate budget does not count as upstream latency
+        with UPSTREAM_SECONDS.time(endpoint=endpoint):
+            response = get_session().get(url, headers=headers, params=params, timeout=timeout)
+        UPSTREAM_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+
+        if response.status_code != 429:
+            coingecko_limiter.success()
+            return response
+
+        retry_after = retry_after_seconds(response)
+        UPSTREAM_RATE_LIMITED.inc(endpoint=endpoint)
+        logger.warning(
+            "Rate limited by CoinGecko",
+            extra={"endpoint": endpoint, "attempt": attempt + 1, "retry_after": retry_after},
+        )
+        coingecko_limiter.backoff(retry_after)
+
+    return response
@@ -0,0 +1,84 @@
+"""
+Measure how long importing the web entry point takes
+
+    python import_budget.py            # checks server against IMPORT_BUDGET_MS (default 800)
+    python import_budget.py utils 300  # any module, explicit budget in ms
+
+Runs the import in a fresh interpreter with -X importtime and exits with status 1 when the
+budget is exceeded, so it can be used as a CI gate.
+
+It also fails when the import starts threads or opens a MongoDB client. The chart render
+pool uses the spawn start method, which re-imports the main module (server.py when started
+with `python server.py`) in every worker process, so that import has to stay free of side effects.
+"""
+import os
+import subprocess
+import sys
+
+
+def measure(module):
+    """Return (cumulative import time of the module in ms, [(ms, package)] of the slowest imports)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "START_BACKGROUND": "0"},
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # Lines look like "import time:  self [us] | cumulative | imported package", nesting is shown by indentation
+    total, imports = 0.0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        ms = int(cumulative) / 1000
+        if name.strip() == module:
+            total = ms
+        else:
+            imports.append((ms, name.strip()))
+
+    return total, sorted(imports, reverse=True)[:10]
+
+
+SIDE_EFFECT_CHECK = """
+import threading, {module}
+import db, chart_store
+assert threading.active_count() == 1, [t.name for t in threading.enumerate()]
+assert db._client is None, "MongoClient created at import"
+assert chart_store._store is None, "ChartStore created at import"
+"""
+
+
+def check_side_effects(module):
+    """Return None when importing the module started nothing, the error output otherwise."""
+    result = subprocess.run(
+        [sys.executable, "-c", SIDE_EFFECT_CHECK.format(module=module)],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "START_BACKGROUND": "0"},
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return None if result.returncode == 0 else result.stderr[-2000:]
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "server"
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else float(os.getenv("IMPORT_BUDGET_MS", 800))
+
+    total, slowest = measure(module)
+    print(f"import {module}: {total:.0f} ms (budget {budget:.0f} ms)")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    side_effects = check_side_effects(module)
+    if side_effects:
+        print(f"import {module} has side effects:\n{side_effects}")
+
+    return 0 if total <= budget and not side_effects else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
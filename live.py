@@ -0,0 +1,126 @@
+import json
+import os
+import queue
+import threading
+import time
+
+
+# Row fields pushed to the browser when they change between two snapshots
+LIVE_FIELDS = (
+    "current_price",
+    "price_change_percentage_1h",
+    "price_change_percentage_24",
+    "price_change_percentage_7d",
+    "price_change_percentage_30d",
+    "market_cap",
+    "total_volume",
+    "market_cap_rank",
+)
+
+
+def diff_snapshots(previous, current):
+    """
+    Changed fields per coin between two market snapshots
+
+    Returns:
+        list: [{"symbol": ..., <changed fields>..., "previous_rank": ... (only on rank moves)}]
+    """
+    # Rows are matched by ticker, a duplicated ticker stands for its highest ranked (first) coin
+    previous_rows = {}
+    for coin in previous.coins:
+        previous_rows.setdefault(coin["symbol"], coin)
+    changes = []
+    seen = set()
+
+    for coin in current.coins:
+        if coin["symbol"] in seen:
+            continue
+        seen.add(coin["symbol"])
+
+        before = previous_rows.get(coin["symbol"])
+        if before is None:
+            changes.append({"symbol": coin["symbol"], **{field: coin[field] for field in LIVE_FIELDS}})
+            continue
+
+        changed = {field: coin[field] for field in LIVE_FIELDS if coin[field] != before[field]}
+        if changed:
+            if "market_cap_rank" in changed:
+                changed["previous_rank"] = before["market_cap_rank"]
+            changes.append({"symbol": coin["symbol"], **changed})
+
+    return changes
+
+
+class LiveUpdates:
+    """
+    Fan-out of market changes to Server-Sent Events clients
+
+    The snapshot store is the only poller, every published snapshot is diffed once against the
+    previous one and the same encoded event is queued for all connected clients.
+
+    Every open stream holds a request thread, so the number of clients per process is capped
+    and each stream ends after `max_duration` seconds. The browser's EventSource reconnects
+    by itself, which spreads long-lived connections over the workers.
+
+    Parameters:
+        max_queue (int): Events buffered per client before it is considered too slow and dropped
+        max_clients (int): Concurrent streams per process (env SSE_MAX_CLIENTS, default 20)
+        max_duration (int): Seconds before a stream is closed (env SSE_MAX_DURATION, default 300)
+    """
+
+    def __init__(self, max_queue=20, max_clients=None, max_duration=None):
+        self.max_queue = max_queue
+        self.max_clients = max_clients or int(os.getenv("SSE_MAX_CLIENTS", 20))
+        self.max_duration = max_duration or int(os.getenv("SSE_MAX_DURATION", 300))
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        """Register a client queue, None when the process already serves max_clients streams."""
+        client = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            self._subscribers.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._subscribers.discard(client)
+
+    def on_snapshot(self, previous, current):
+        """MarketSnapshotStore listener."""
+        if previous is None:
+            return
+
+        changes = diff_snapshots(previous, current)
+        if changes:
+            self.publish(json.dumps({"version": current.version, "changes": changes}))
+
+    def publish(self, data):
+        message = f"event: market\ndata: {data}\n\n"
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for client in subscribers:
+            try:
+                client.put_nowait(message)
+            except queue.Full:
+                # The stream generator notices it was removed and ends the response
+                self.unsubscribe(client)
+
+    def stream(self, client, heartbeat=15):
+        """Generator of SSE messages for one client, with comment heartbeats to keep proxies from closing it."""
+        closes_at = time.monotonic() + self.max_duration
+        try:
+            yield "retry: 5000\n\n"
+            while time.monotonic() < closes_at:
+                try:
+                    yield client.get(timeout=heartbeat)
+                except queue.Empty:
+                    with self._lock:
+                        if client not in self._subscribers:
+                            return
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(client)
@@ -0,0 +1,41 @@
+import json
+import logging
+import os
+from datetime import datetime, timezone
+
+
+# Attributes every LogRecord has, anything else was passed through `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and the `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None):
+    """
+    Log to stderr as JSON lines
+
+    Parameters:
+        level (str): Log level (env LOG_LEVEL, default INFO)
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level or os.getenv("LOG_LEVEL", "INFO").upper())
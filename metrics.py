@@ -0,0 +1,155 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(zip(self.labels, key)), value) for key, value in self._values.items()]
+
+
+class Histogram:
+    """Cumulative bucket histogram of durations in seconds, optionally split by labels."""
+
+    type = "histogram"
+    DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            state = self._values.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = dict(zip(self.labels, key))
+                for bound, count in zip(self.buckets, state):
+                    samples.append((f"{self.name}_bucket", {**labels, "le": repr(float(bound))}, count))
+                samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, state[-1]))
+                samples.append((f"{self.name}_sum", labels, state[-2]))
+                samples.append((f"{self.name}_count", labels, state[-1]))
+        return samples
+
+
+class CallbackMetric:
+    """Values read from a callback at scrape time, e.g. counters kept by a cache."""
+
+    def __init__(self, name, help, callback, type="gauge"):
+        self.name = name
+        self.help = help
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.callback()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Registering the same name twice (e.g. two app instances in tests) keeps the first one
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name, help, labels=()):
+    return REGISTRY.register(Counter(name, help, labels))
+
+
+def histogram(name, help, labels=(), buckets=Histogram.DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+def callback_metric(name, help, callback, type="gauge"):
+    return REGISTRY.register(CallbackMetric(name, help, callback, type))
+
+
+# Metrics shared by the modules that do upstream, database and render work
+UPSTREAM_SECONDS = histogram(
+    "coingecko_request_duration_seconds", "CoinGecko HTTP request latency", ("endpoint",)
+)
+UPSTREAM_REQUESTS = counter(
+    "coingecko_requests_total", "CoinGecko HTTP responses by status", ("endpoint", "status")
+)
+UPSTREAM_RATE_LIMITED = counter(
+    "coingecko_rate_limited_total", "CoinGecko 429 responses", ("endpoint",)
+)
+MONGO_SECONDS = histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command", "outcome")
+)
+CHART_RENDER_SECONDS = histogram(
+    "chart_render_batch_duration_seconds", "Duration of one chart render cycle", (),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+CHARTS_RENDERED = counter("charts_rendered_total", "Charts rendered and stored")
+TEMPLATE_SECONDS = histogram(
+    "template_render_duration_seconds", "Jinja template render latency", ("template",)
+)
+HTTP_SECONDS = histogram(
+    "http_request_duration_seconds", "Request latency by route", ("endpoint", "method", "status")
+)
@@ -1,17 +1,87 @@
-from mongoengine import Document, StringField, FloatField, DateTimeField, ListField, DictField
+import logging
+import sys
+
+from mongoengine import Document, StringField, FloatField, DateTimeField, ListField, DictField, BinaryField, IntField, LongField
 from datetime import datetime
 
+import numpy as np
+
+from series import (
+    SPARKLINE_POINTS, compute_rollups, history_to_series, pack_series, unpack_rollup, unpack_series
+)
+
+
+logger = logging.getLogger(__name__)
+
 
 # MongoDB model for cryptocurrency price history
 class PriceHistory(Document):
     symbol = StringField(required=True)
     name = StringField(required=True)
-    history = ListField(DictField())
+    history = ListField(DictField())  # Legacy format, emptied by migrate_history_to_columnar
     last_updated = DateTimeField(default=datetime.utcnow)
 
+    # Compact format: parallel little endian int64 epoch ms and float64 price columns
+    timestamps = BinaryField()
+    prices = BinaryField()
+    point_count = IntField(default=0)
+    last_timestamp = LongField()  # Epoch ms of the newest point, so freshness checks never scan the series
+
+    # Precomputed resolutions, see series.compute_rollups: "1h"/"4h"/"1d" OHLC and "sparkline".
+    # Typed as binary, an untyped DictField stores bytes as a list with one int per byte
+    rollups = DictField(field=BinaryField())
+
     meta = {
         'indexes': [
             'symbol',
             {'fields': ['last_updated']}
         ]
-    }
\ No newline at end of file
+    }
+
+    def get_series(self):
+        """Return (timestamps in epoch ms, prices) as NumPy arrays, from whichever format is stored."""
+        if self.timestamps:
+            return unpack_series(self.timestamps, self.prices)
+        return history_to_series(self.history or [])
+
+    def set_series(self, timestamps_ms, prices):
+        """Store the series in the compact format with its rollups and drop the legacy list."""
+        timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+        self.timestamps, self.prices = pack_series(timestamps_ms, prices)
+        self.point_count = len(prices)
+        self.last_timestamp = int(np.max(timestamps_ms)) if len(timestamps_ms) else None
+        self.rollups = compute_rollups(timestamps_ms, prices, SPARKLINE_POINTS)
+        self.history = []
+
+    def get_rollup(self, resolution):
+        """Stored rollup matrix ("1h", "4h", "1d" or "sparkline"), computed from the series for old records."""
+        if self.rollups and resolution in self.rollups:
+            return unpack_rollup(self.rollups[resolution], resolution)
+        return unpack_rollup(compute_rollups(*self.get_series(), SPARKLINE_POINTS)[resolution], resolution)
+
+
+def migrate_history_to_columnar():
+    """Rewrite every document that still stores a list of dicts in the compact format."""
+    migrated = 0
+
+    for record in PriceHistory.objects(history__0__exists=True):
+        record.set_series(*history_to_series(record.history))
+        record.save()
+        migrated += 1
+
+    logger.info("Migrated price histories to the columnar format", extra={"count": migrated})
+    return migrated
+
+
+if __name__ == "__main__":
+    # python models.py migrate
+    if sys.argv[1:] == ["migrate"]:
+        from db import connect_mongoengine
+        from logging_config import configure_logging
+
+        configure_logging()
+        connect_mongoengine()
+        migrate_history_to_columnar()
+    else:
+        print("Usage: python models.py migrate")
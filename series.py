@@ -0,0 +1,194 @@
+import os
+from datetime import datetime
+
+import numpy as np
+
+
+# Packed column layouts, little endian so the bytes are portable between hosts
+TIMESTAMP_DTYPE = np.dtype("<i8")  # epoch milliseconds
+PRICE_DTYPE = np.dtype("<f8")
+
+SPARKLINE_POINTS = int(os.getenv("SPARKLINE_POINTS", 84))  # LTTB size of the stored sparkline series
+
+
+def pack_series(timestamps_ms, prices):
+    """Pack parallel timestamp (epoch ms) and price sequences into two binary blobs."""
+    return (
+        np.asarray(timestamps_ms, dtype=TIMESTAMP_DTYPE).tobytes(),
+        np.asarray(prices, dtype=PRICE_DTYPE).tobytes(),
+    )
+
+
+def unpack_series(timestamps_blob, prices_blob):
+    """Return read-only NumPy views over packed blobs, no per-point objects are created."""
+    if not timestamps_blob:
+        return np.empty(0, TIMESTAMP_DTYPE), np.empty(0, PRICE_DTYPE)
+    return (
+        np.frombuffer(timestamps_blob, dtype=TIMESTAMP_DTYPE),
+        np.frombuffer(prices_blob, dtype=PRICE_DTYPE),
+    )
+
+
+def history_to_series(history):
+    """Convert a legacy list of {timestamp, price} dicts to (epoch ms, price) arrays."""
+    timestamps = np.fromiter(
+        (int(to_epoch_ms(entry["timestamp"])) for entry in history), dtype=TIMESTAMP_DTYPE, count=len(history)
+    )
+    prices = np.fromiter((entry["price"] for entry in history), dtype=PRICE_DTYPE, count=len(history))
+    return timestamps, prices
+
+
+def series_to_history(timestamps, prices):
+    """Build the legacy list of {timestamp, price} dicts, only for callers that still need it."""
+    return [
+        {"timestamp": datetime.utcfromtimestamp(ts / 1000), "price": price}
+        for ts, price in zip(timestamps.tolist(), prices.tolist())
+    ]
+
+
+def to_epoch_ms(timestamp):
+    """Naive datetimes are stored as UTC by Mongo, so they are read back as UTC here."""
+    if isinstance(timestamp, datetime):
+        return (timestamp - datetime(1970, 1, 1, tzinfo=timestamp.tzinfo)).total_seconds() * 1000
+    return float(timestamp)
+
+
+def doc_series(doc):
+    """(timestamps, prices) arrays of a raw price_history document, in either storage format."""
+    if doc.get("timestamps"):
+        return unpack_series(doc["timestamps"], doc["prices"])
+    return history_to_series(doc.get("history") or [])
+
+
+def doc_sparkline(doc, points=SPARKLINE_POINTS):
+    """(timestamps, prices) of the stored sparkline rollup, downsampled from the series for old documents."""
+    blob = (doc.get("rollups") or {}).get("sparkline")
+    if blob:
+        matrix = unpack_rollup(blob, "sparkline")
+        return matrix[:, 0].astype(TIMESTAMP_DTYPE), matrix[:, 1]
+    return lttb(*doc_series(doc), points)
+
+
+def merge_series(timestamps, prices, new_timestamps, new_prices, retention_ms, now_ms):
+    """
+    Merge freshly fetched points into a stored series
+
+    Only points newer than the last stored point are added, so duplicates and overlapping
+    fetch windows are dropped. Points older than the retention window are removed.
+
+    Returns:
+        tuple: (timestamps, prices) arrays, sorted by time
+    """
+    if len(timestamps) > 1 and np.any(np.diff(timestamps) < 0):
+        order = np.argsort(timestamps, kind="stable")
+        timestamps, prices = timestamps[order], prices[order]
+
+    # np.unique sorts and returns the index of the first occurrence of every timestamp
+    new_timestamps, first = np.unique(new_timestamps, return_index=True)
+    new_prices = new_prices[first]
+
+    if len(timestamps):
+        newer = new_timestamps > timestamps[-1]
+        new_timestamps, new_prices = new_timestamps[newer], new_prices[newer]
+
+    timestamps = np.concatenate([timestamps, new_timestamps]).astype(TIMESTAMP_DTYPE)
+    prices = np.concatenate([prices, new_prices]).astype(PRICE_DTYPE)
+
+    retained = timestamps >= now_ms - retention_ms
+    return timestamps[retained], prices[retained]
+
+
+# Stored OHLC resolutions, bucket size in ms
+ROLLUP_INTERVALS = {
+    "1h": 3_600_000,
+    "4h": 4 * 3_600_000,
+    "1d": 24 * 3_600_000,
+}
+OHLC_COLUMNS = ("t", "o", "h", "l", "c")
+LINE_COLUMNS = ("t", "p")
+
+
+def ohlc(timestamps, prices, interval_ms):
+    """
+    Open/high/low/close per time bucket, computed without a Python loop
+
+    Returns:
+        ndarray: float64 matrix with one row per bucket: bucket start (epoch ms), open, high, low, close
+    """
+    if not len(timestamps):
+        return np.empty((0, len(OHLC_COLUMNS)), dtype=PRICE_DTYPE)
+
+    buckets = timestamps // interval_ms
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    ends = np.concatenate([starts[1:] - 1, [len(prices) - 1]])
+
+    return np.column_stack([
+        buckets[starts] * interval_ms,
+        prices[starts],
+        np.maximum.reduceat(prices, starts),
+        np.minimum.reduceat(prices, starts),
+        prices[ends],
+    ]).astype(PRICE_DTYPE)
+
+
+def lttb(timestamps, prices, points):
+    """
+    Largest-Triangle-Three-Buckets downsampling
+
+    Keeps the points that carry the visual shape of the series (peaks and dips) instead of
+    every n-th point. The first and last point are always kept.
+    """
+    n = len(timestamps)
+    if points >= n or points < 3:
+        return timestamps, prices
+
+    x = timestamps.astype(np.float64)
+    y = prices.astype(np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.intp)  # Bucket boundaries, excluding the end points
+    selected = np.empty(points, dtype=np.intp)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+
+        # Average of the next bucket (or the last point) is the third corner of the triangle
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+
+    return timestamps[selected], prices[selected]
+
+
+def compute_rollups(timestamps, prices, sparkline_points):
+    """
+    All stored resolutions of a series, packed as little endian float64 row-major matrices
+
+    Returns:
+        dict: "1h"/"4h"/"1d" -> OHLC matrix bytes, "sparkline" -> (t, p) matrix bytes
+    """
+    rollups = {name: ohlc(timestamps, prices, interval).tobytes() for name, interval in ROLLUP_INTERVALS.items()}
+    spark_timestamps, spark_prices = lttb(timestamps, prices, sparkline_points)
+    rollups["sparkline"] = np.column_stack([spark_timestamps, spark_prices]).astype(PRICE_DTYPE).tobytes()
+    return rollups
+
+
+def unpack_rollup(blob, resolution):
+    """Matrix view over a stored rollup, OHLC resolutions have 5 columns and the sparkline 2."""
+    columns = LINE_COLUMNS if resolution == "sparkline" else OHLC_COLUMNS
+    if isinstance(blob, list):
+        blob = bytes(blob)  # Written by an untyped DictField as one int per byte, until the next refresh
+    return np.frombuffer(blob or b"", dtype=PRICE_DTYPE).reshape(-1, len(columns))
+
+
+def rollup_columns(matrix, resolution):
+    """Columnar dict of a rollup matrix, e.g. {"t": [...], "o": [...], ...}."""
+    columns = LINE_COLUMNS if resolution == "sparkline" else OHLC_COLUMNS
+    return {name: matrix[:, i].tolist() for i, name in enumerate(columns)}
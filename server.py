@@ -1,155 +1,546 @@
-import base64
-from io import BytesIO
-from flask import Flask, render_template, jsonify, send_file, current_app, Response
-from flask_pymongo import MongoClient
-
-from utils import TokenDashboard
-from mongoengine import connect
-import threading
+import gzip
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from PIL import Image
 
-app = Flask(__name__)
+from flask import Blueprint, Flask, g, render_template, jsonify, Response, request, stream_with_context
+
+from snapshot import MarketSnapshotStore
+from live import LiveUpdates
+from cache import ByteLRUCache, TTLCache
+from categories import CategoriesUnavailable, CategoryService
+from chart_store import get_chart_store
+from coordination import get_coordinator
+from db import connect_mongoengine
+from chart_pipeline import ChartRenderPipeline
+from http_client import coingecko_limiter
+from logging_config import configure_logging
+from metrics import HTTP_SECONDS, REGISTRY, TEMPLATE_SECONDS, callback_metric
+from series import ROLLUP_INTERVALS, lttb, rollup_columns, series_to_history, unpack_rollup, unpack_series
+from sparkline import MIMETYPES
+
+try:
+    import orjson
+except ImportError:  # Optional, only makes the batch chart API faster
+    orjson = None
+
+# Routes are registered on the app by create_app(), importing this module does no I/O
+bp = Blueprint("dashboard", __name__)
+
+logger = logging.getLogger(__name__)
+
+# Per-worker read-through cache in front of the price_history collection that all workers share,
+# symbol -> (epoch ms timestamps, prices) arrays
+price_history_cache = TTLCache(
+    max_entries=int(os.getenv("PRICE_HISTORY_CACHE_SIZE", 1000)),
+    ttl=int(os.getenv("PRICE_HISTORY_CACHE_TTL", 900)),
+    stale_ttl=int(os.getenv("PRICE_HISTORY_CACHE_STALE_TTL", 3600)),
+)
+PREFETCH_LEASE_TTL = 600  # Upper bound for one prefetch run, a crashed run frees the lease after this
+
+# Shared top 500 snapshot, refreshed in the background so page views never wait on CoinGecko
+market_snapshot = MarketSnapshotStore()
+
+# Pushes the changes of every new snapshot to the browsers connected to /api/stream
+live_updates = LiveUpdates()
+market_snapshot.add_listener(live_updates.on_snapshot)
+
+# Encoded chart images by GridFS file id, bounded by their total size. Every chart version has
+# its own file, so a worker never serves an image after another worker stored a newer one.
+chart_cache = ByteLRUCache(
+    max_bytes=int(os.getenv("CHART_CACHE_BYTES", 32 * 1024 * 1024)),
+    ttl=int(os.getenv("CHART_CACHE_TTL", 300)),
+)
+CHART_MAX_AGE = int(os.getenv("CHART_MAX_AGE", 300))  # Browser cache lifetime for chart images
+
+# Thumbnail charts are rendered in the background, /chart/<ticker> serves the stored results
+chart_pipeline = ChartRenderPipeline(market_snapshot)
+
+MAX_BATCH_SYMBOLS = 100  # Per /api/price-charts and /api/categories request
+
+# Shared by all /api/price-charts requests, so concurrent batches cannot multiply the loader
+# threads. Its threads are started on the first batch, not at import. One request only gets
+# a share of the threads, a large batch cannot hold up every other request.
+price_charts_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("PRICE_CHARTS_WORKERS", 8)), thread_name_prefix="price-charts"
+)
+PRICE_CHARTS_REQUEST_WORKERS = int(os.getenv("PRICE_CHARTS_REQUEST_WORKERS", 2))
+
+
+def map_price_charts(fn, items):
+    """Like price_charts_executor.map, with at most PRICE_CHARTS_REQUEST_WORKERS items of this call queued or running."""
+    slots = threading.BoundedSemaphore(PRICE_CHARTS_REQUEST_WORKERS)
+    futures = []
+    for item in items:
+        slots.acquire()
+        future = price_charts_executor.submit(fn, item)
+        future.add_done_callback(lambda _: slots.release())
+        futures.append(future)
+    return [future.result() for future in futures]
+
+# Coin categories for the hover tooltips, stored in MongoDB and prefetched for the top coins
+category_service = CategoryService(market_snapshot)
+
+# Rows rendered server-side on the first page load, the rest is loaded through /api/coins
+PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", 50))
+
+
+def _caches():
+    return (
+        ("price_history", price_history_cache),
+        ("chart", chart_cache),
+        ("categories", category_service.cache),
+    )
+
+
+def _cache_samples(*fields):
+    def samples():
+        for name, cache in _caches():
+            stats = cache.stats()
+            for field in fields:
+                if field in stats:
+                    yield {"cache": name, "result": field}, stats[field]
+    return samples
 
-# Global cache for price histories
-price_history_cache = {}
-is_fetching = False
+
+def _cache_hit_ratio():
+    for name, cache in _caches():
+        stats = cache.stats()
+        hits = stats["hits"] + stats.get("stale_hits", 0)
+        lookups = hits + stats["misses"]
+        yield {"cache": name}, hits / lookups if lookups else 0.0
+
+
+# Cache counters are kept by the caches themselves and read when /metrics is scraped
+callback_metric(
+    "cache_lookups_total", "Cache lookups by result", _cache_samples("hits", "stale_hits", "misses"), type="counter"
+)
+callback_metric("cache_evictions_total", "Cache evictions", _cache_samples("evictions"), type="counter")
+callback_metric("cache_hit_ratio", "Share of cache lookups served from the cache", _cache_hit_ratio)
+callback_metric(
+    "coingecko_rate_limit_per_minute", "Current adaptive CoinGecko request rate",
+    lambda: [({}, coingecko_limiter.rate * 60)],
+)
 
 
 # MongoDB connection
 def setup_mongodb():
-    mongodb_uri = os.getenv("MONGODB_URI")
-    if not mongodb_uri:
-        print("Warning: MONGODB_URI not found in environment variables")
-        mongodb_uri = "mongodb://localhost:27017/crypto_tracker"
+    if not os.getenv("MONGODB_URI"):
+        logger.warning("MONGODB_URI not found in environment variables")
 
     try:
-        connect(host=mongodb_uri)
-        print("MongoDB connection established")
-    except Exception as e:
-        print(f"Error connecting to MongoDB: {e}")
+        connect_mongoengine()
+        logger.info("MongoDB connection established")
+    except Exception:
+        logger.exception("Error connecting to MongoDB")
+
+
+def _last_timestamp(series):
+    return int(series[0][-1]) if series is not None and len(series[0]) else None
 
 
 # Background thread function to fetch price histories
 def fetch_price_histories_background(coins, num_coins=50):
-    global price_history_cache, is_fetching
+    # The lease replaces a per-process flag, so only one run at a time across all workers
+    with get_coordinator().lease("price-history-prefetch", ttl=PREFETCH_LEASE_TTL) as acquired:
+        if not acquired:
+            return
 
-    try:
-        dashboard = TokenDashboard()
+        dashboard = market_snapshot.dashboard()
+        updated = 0
         # Start with the top N coins to prioritize popular ones
         for coin in coins[:num_coins]:
             symbol = coin['symbol'].upper()
             try:
-                price_history_cache[symbol] = dashboard.fetch_price_history_by_symbol(symbol)
-                print(f"Fetched price history for {symbol}")
-            except Exception as e:
-                print(f"Error fetching price history for {symbol}: {e}")
-    finally:
-        is_fetching = False
-        print("Background fetching completed")
+                previous = price_history_cache.peek(symbol)
+                series = dashboard.fetch_price_series_by_symbol(symbol)
+                price_history_cache.set(symbol, series)
+                if _last_timestamp(series) != _last_timestamp(previous):
+                    updated += 1
+                logger.debug("Fetched price history", extra={"symbol": symbol})
+            except Exception:
+                logger.exception("Error fetching price history", extra={"symbol": symbol})
+
+        if updated:
+            chart_pipeline.trigger()  # Histories changed, redraw the charts
+
+    logger.info("Background fetching completed", extra={"updated": updated})
+
+
+def prefetch_price_histories(previous, current):
+    """Snapshot listener, the background leader refreshes the top histories after every new snapshot"""
+    if get_coordinator().is_leader():
+        threading.Thread(target=fetch_price_histories_background, args=(current.coins,), daemon=True).start()
+
 
+market_snapshot.add_listener(prefetch_price_histories)
 
-# Call this function at application startup
-setup_mongodb()
 
+def is_tracked(symbol):
+    """Whether the ticker is in the current market snapshot, only those are fetched and cached"""
+    return market_snapshot.get().index.get(symbol) is not None
 
-@app.route("/")
+
+def load_price_series(symbol):
+    """Price series for a symbol through the cache, fetched (and stored) on a miss"""
+    if not is_tracked(symbol):
+        return unpack_series(b"", b"")  # Never let arbitrary tickers take cache slots
+    return price_history_cache.get(
+        symbol, lambda: market_snapshot.dashboard().fetch_price_series_by_symbol(symbol)
+    )
+
+
+def load_rollup(symbol, resolution):
+    """Stored rollup matrix for a symbol through the cache, fetched on a miss"""
+    if not is_tracked(symbol):
+        return unpack_rollup(b"", resolution)
+    return price_history_cache.get(
+        f"{symbol}:{resolution}",
+        lambda: market_snapshot.dashboard().fetch_rollup_by_symbol(symbol, resolution),
+    )
+
+
+def create_app(start_background=None):
+    """
+    Application factory, connects to MongoDB and starts the background workers
+
+    Parameters:
+        start_background (bool): Start the snapshot poller and chart renderer
+            (env START_BACKGROUND, default on). Turn off for tests and one-off scripts.
+    """
+    configure_logging()
+
+    app = Flask(__name__)
+    app.register_blueprint(bp)
+
+    setup_mongodb()
+    get_chart_store().ensure_indexes()
+
+    if start_background is None:
+        start_background = os.getenv("START_BACKGROUND", "1") != "0"
+    if start_background:
+        market_snapshot.start()
+        chart_pipeline.start()
+        category_service.start()
+
+    return app
+
+
+def render_page(template_name, **context):
+    """render_template() with the render time recorded per template."""
+    with TEMPLATE_SECONDS.time(template=template_name):
+        return render_template(template_name, **context)
+
+
+@bp.before_app_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+
+@bp.after_app_request
+def record_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        HTTP_SECONDS.observe(
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
+
+@bp.route("/metrics")
+def metrics():
+    """Prometheus text format: latency histograms, upstream and cache counters."""
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route("/")
 def index():
-    global is_fetching
+    snapshot = market_snapshot.get()  # Served from the shared snapshot
+
+    # Price histories are refreshed by the background leader, the page never waits for them
+    total, first_page = snapshot.index.query(limit=PAGE_SIZE)
+    return render_page('dashboard.html', coins=first_page, total=total, page_size=PAGE_SIZE, abs=abs)
 
-    dashboard = TokenDashboard()
-    coins = dashboard.coingecko_top500()  # Fetches basic info
-    plot_data = dashboard.plot_7d_chart()  # All plots are stored in a buffer
 
-    app.config["PLOT_DATA"] = plot_data  # Acces this from chart route
+@bp.route('/api/coins')
+def get_coins():
+    """Search, sort and paginate the coin table from the precomputed snapshot indexes"""
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', PAGE_SIZE)), 1), 250)
+        total, coins = market_snapshot.get().index.query(
+            q=request.args.get('q', ''),
+            sort=request.args.get('sort', 'rank'),
+            order=request.args.get('order', 'asc'),
+            offset=offset,
+            limit=limit,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    # Start a background thread to fetch price histories if not already fetching
-    if not is_fetching:
-        is_fetching = True
-        # Start background thread to fetch price histories
-        threading.Thread(
-            target=fetch_price_histories_background,
-            args=(coins,)
-        ).start()
+    return jsonify({'total': total, 'offset': offset, 'limit': limit, 'coins': coins})
 
-    # Return the page without waiting for price histories
-    return render_template('dashboard.html', coins=coins, abs=abs)
 
+@bp.route('/api/stream')
+def stream_updates():
+    """Server-Sent Events stream of market changes, fed by the shared snapshot poller"""
+    client = live_updates.subscribe()
+    if client is None:
+        response = jsonify({'error': 'Too many live update streams, retry later'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
 
-@app.route('/api/price-chart/<symbol>')
+    response = Response(stream_with_context(live_updates.stream(client)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
+
+
+@bp.route('/api/price-chart/<symbol>')
 def get_price_chart(symbol):
     """Endpoint to get price history data for a specific coin"""
     symbol = symbol.upper()
+    if not is_tracked(symbol):
+        return jsonify({'error': f'Unknown symbol: {symbol}'}), 404
 
-    # Get from cache if available
-    if symbol in price_history_cache:
-        price_data = price_history_cache[symbol]
-    else:
-        # Fetch if not in cache
-        dashboard = TokenDashboard()
-        price_data = dashboard.fetch_price_history_by_symbol(symbol)
-        price_history_cache[symbol] = price_data
+    timestamps, prices = load_price_series(symbol)
 
     # Convert to format suitable for charts
-    chart_data = []
-    for entry in price_data:
-        chart_data.append({
-            'timestamp': entry['timestamp'].isoformat(),
-            'price': entry['price']
-        })
+    chart_data = [
+        {'timestamp': datetime.utcfromtimestamp(ts / 1000).isoformat(), 'price': price}
+        for ts, price in zip(timestamps.tolist(), prices.tolist())
+    ]
 
     return jsonify(chart_data)
 
 
-@app.route('/coin/<symbol>')
+def json_response(payload):
+    """JSON response encoded with orjson when available, gzipped when the client accepts it"""
+    body = orjson.dumps(payload) if orjson else json.dumps(payload, separators=(',', ':')).encode()
+    response = Response(body, mimetype='application/json')
+
+    if len(body) > 1024 and 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def parse_symbols():
+    """Unique upper-cased tickers from the comma separated `symbols` query parameter"""
+    return list(dict.fromkeys(
+        symbol.strip().upper() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()
+    ))
+
+
+@bp.route('/api/price-charts')
+def get_price_charts():
+    """
+    Price histories of several coins in one response
+
+    Query parameters:
+        symbols: Comma separated tickers, e.g. BTC,ETH
+        resolution: "raw" (default), "sparkline", or an OHLC rollup: "1h", "4h", "1d"
+        points: Optional maximum number of points per symbol for raw/sparkline (LTTB)
+
+    Returns columnar data per symbol, {"BTC": {"t": [epoch ms, ...], "p": [price, ...]}}
+    for line series and {"t", "o", "h", "l", "c"} for OHLC rollups. Symbols that are not
+    tracked are null.
+    """
+    symbols = parse_symbols()
+    if not symbols:
+        return jsonify({'error': 'symbols is required'}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_BATCH_SYMBOLS} symbols per request'}), 400
+
+    resolution = request.args.get('resolution', 'raw')
+    if resolution not in ('raw', 'sparkline', *ROLLUP_INTERVALS):
+        return jsonify({'error': f'Unknown resolution: {resolution}'}), 400
+
+    try:
+        points = int(request.args.get('points', 0))
+    except ValueError:
+        return jsonify({'error': 'points must be an integer'}), 400
+
+    def load(symbol):
+        if resolution == 'raw':
+            timestamps, prices = load_price_series(symbol)
+            if points:
+                timestamps, prices = lttb(timestamps, prices, points)
+            return {'t': timestamps.tolist(), 'p': prices.tolist()}
+
+        matrix = load_rollup(symbol, resolution)
+        if points and resolution == 'sparkline':
+            timestamps, prices = lttb(matrix[:, 0], matrix[:, 1], points)
+            return {'t': timestamps.astype('int64').tolist(), 'p': prices.tolist()}
+        columns = rollup_columns(matrix, resolution)
+        columns['t'] = [int(ts) for ts in columns['t']]
+        return columns
+
+    # Cache misses are fetched in parallel instead of one after another
+    tracked = [symbol for symbol in symbols if is_tracked(symbol)]
+    payload = dict.fromkeys(symbols)
+    payload.update(zip(tracked, map_price_charts(load, tracked)))
+
+    return json_response(payload)
+
+
+@bp.route('/api/analytics')
+def get_analytics():
+    """
+    Returns, volatility and drawdowns of all tracked coins
+
+    Query parameters:
+        windows: Comma separated trailing windows in hours (default 24,168)
+        symbols: Optional comma separated tickers
+    """
+    try:
+        windows = tuple(int(hours) for hours in request.args.get('windows', '24,168').split(','))
+    except ValueError:
+        return jsonify({'error': 'windows must be a list of hours'}), 400
+
+    snapshot = market_snapshot.get()
+    # The default windows are already computed for the snapshot
+    if windows == (24, 168):
+        metrics = snapshot.metrics
+    else:
+        price_matrix = snapshot.get_price_matrix()
+        metrics = price_matrix.metrics(windows) if price_matrix else None
+    if not metrics:
+        return jsonify({'error': 'Analytics are not available yet'}), 503
+
+    symbols = request.args.get('symbols')
+    if symbols:
+        metrics = {s: metrics[s] for s in symbols.upper().split(',') if s in metrics}
+
+    return json_response({'version': snapshot.version, 'metrics': metrics})
+
+
+@bp.route('/api/analytics/correlation')
+def get_correlation():
+    """
+    Correlation matrix of hourly log returns
+
+    Query parameters:
+        symbols: Optional comma separated tickers (default all tracked coins)
+        window: Trailing window in hours (default 168)
+    """
+    snapshot = market_snapshot.get()
+    price_matrix = snapshot.get_price_matrix()
+    if price_matrix is None:
+        return jsonify({'error': 'Analytics are not available yet'}), 503
+
+    try:
+        window_ms = int(request.args.get('window', 168)) * 3_600_000
+    except ValueError:
+        return jsonify({'error': 'window must be a number of hours'}), 400
+
+    requested = request.args.get('symbols')
+    symbols, matrix = price_matrix.correlation(
+        requested.upper().split(',') if requested else None, window_ms
+    )
+    return json_response({
+        'version': snapshot.version,
+        'symbols': symbols,
+        'matrix': [[None if value != value else value for value in row] for row in matrix.tolist()],
+    })
+
+
+@bp.route('/api/categories/<symbol>')
+def get_categories(symbol):
+    """Categories of one coin for the hover tooltip, fetched from CoinGecko when not cached"""
+    symbol = symbol.upper()
+    try:
+        categories = category_service.get(symbol)
+    except CategoriesUnavailable:
+        return jsonify({'error': 'Categories are temporarily unavailable'}), 503
+
+    if categories is None:
+        return jsonify({'error': f'Unknown symbol: {symbol}'}), 404
+    return jsonify({'symbol': symbol, 'categories': categories})
+
+
+@bp.route('/api/categories')
+def get_categories_batch():
+    """
+    Cached categories of several coins, never waits on CoinGecko
+
+    Query parameters:
+        symbols: Comma separated tickers, e.g. BTC,ETH
+
+    Returns {"BTC": ["Layer 1 (L1)", ...], "ETH": null, ...}, null where nothing is cached yet.
+    """
+    symbols = parse_symbols()
+    if not symbols:
+        return jsonify({'error': 'symbols is required'}), 400
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        return jsonify({'error': f'At most {MAX_BATCH_SYMBOLS} symbols per request'}), 400
+
+    return jsonify(category_service.get_many(symbols))
+
+
+@bp.route('/coin/<symbol>')
 def coin_detail(symbol):
     symbol = symbol.upper()
-    dashboard = TokenDashboard()
+    snapshot = market_snapshot.get()
 
     # Get basic coin info
-    coins = dashboard.coingecko_top500()
-    coin_info = next((coin for coin in coins if coin['symbol'].upper() == symbol), None)
+    coin_info = snapshot.index.get(symbol)
 
     if not coin_info:
         return f"Cryptocurrency {symbol} not found", 404
 
     # Get price history (either from cache or fetch it)
-    if symbol in price_history_cache:
-        price_data = price_history_cache[symbol]
-    else:
-        price_data = dashboard.fetch_price_history_by_symbol(symbol)
-        price_history_cache[symbol] = price_data
+    price_data = series_to_history(*load_price_series(symbol))
 
-    return render_template('token-panel.html',
-                           symbol=symbol,
-                           coin_info=coin_info,
-                           price_data=price_data,
-                           is_detail_view=True)
+    return render_page('token-panel.html',
+                       symbol=symbol,
+                       coin_info=coin_info,
+                       price_data=price_data,
+                       is_detail_view=True)
 
 
-@app.route("/chart/<ticker>")
+@bp.route("/chart/<ticker>")
 def get_chart(ticker):
     ticker = ticker.upper()
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client["crypto_tracker"]
-    collection = db["price_history"]
 
-    document = collection.find_one(
-        {"symbol": ticker},
-        {"chart_image": 1}
-    )
+    # The pointer document is read on every request, it tells which version is current
+    chart_store = get_chart_store()
+    meta = chart_store.get_meta(ticker)
+    if not meta:
+        return f"{ticker} chart not found", 404
 
-    if document and "chart_image" in document:
-        return Response(
-            document["chart_image"],
-            mimetype="image/png"
-        )
-    else:
-        return f"{ticker} chart not found"
+    image_data = chart_cache.get(meta["file_id"])
+    if image_data is None:
+        image_data = chart_store.read(meta["file_id"])
+        if image_data is None:
+            # A render replaced the file after the pointer was read, the new pointer is in place now
+            meta = chart_store.get_meta(ticker)
+            image_data = chart_store.read(meta["file_id"]) if meta else None
+            if image_data is None:
+                return f"{ticker} chart not found", 404
+        chart_cache.set(meta["file_id"], image_data)
+
+    response = Response(image_data, mimetype=MIMETYPES[meta["format"]])
+    response.cache_control.public = True
+    response.cache_control.max_age = CHART_MAX_AGE
+
+    # Charts are versioned by the digest of their history, fall back to the upload time
+    updated_at = meta["updated_at"]
+    response.set_etag(meta.get("digest") or f"{ticker}-{int(updated_at.timestamp() * 1000)}")
+    response.last_modified = updated_at
 
-    clien.close()
+    # Turns the response into a 304 when If-None-Match / If-Modified-Since still match
+    return response.make_conditional(request)
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,206 @@
+import logging
+import os
+import threading
+import time
+
+from analytics import PriceMatrix, add_row_metrics
+from coin_index import CoinIndex
+from coordination import get_coordinator
+from utils import TokenDashboard
+
+
+logger = logging.getLogger(__name__)
+
+
+class MarketSnapshot:
+    """One parsed top-500 fetch and its query indexes. Treated as read-only once it has been published."""
+
+    def __init__(self, coins, symbol_to_id_map, version, price_matrix=None, metrics=None):
+        self.coins = coins
+        self.symbol_to_id_map = symbol_to_id_map
+        self.version = version
+        # Cross-asset analytics, computed once per snapshot version by the leader
+        self.metrics = metrics or {}
+        self._price_matrix = price_matrix
+        self._price_matrix_lock = threading.Lock()
+        self.index = CoinIndex(coins)  # Built here so requests never pay for it
+        self.fetched_at = time.time()
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def get_price_matrix(self):
+        """
+        Price matrix the metrics were computed from, None when analytics are unavailable
+
+        Workers that received the snapshot from the leader only have the metrics, they load
+        the matrix on first use (custom windows, correlations) instead of on every version.
+        """
+        if self._price_matrix is None and self.metrics:
+            with self._price_matrix_lock:
+                if self._price_matrix is None:
+                    try:
+                        self._price_matrix = PriceMatrix.load()
+                    except Exception:
+                        logger.exception("Error loading price matrix")
+        return self._price_matrix
+
+
+class MarketSnapshotStore:
+    """
+    Process-wide holder for the latest CoinGecko market snapshot
+
+    Requests read whatever snapshot is currently published. When it is older than the TTL a
+    background refresh is started and the stale snapshot keeps being served until the new one
+    is ready. Only one upstream fetch runs at a time, every caller that needs fresh data
+    shares it.
+
+    With several worker processes only the holder of the background lease fetches from
+    CoinGecko, it publishes the coins through the coordination layer and the other workers
+    load them from there.
+
+    Parameters:
+        ttl (int): Seconds before a snapshot is considered stale (env MARKET_SNAPSHOT_TTL, default 60)
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else int(os.getenv("MARKET_SNAPSHOT_TTL", 60))
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._in_flight = None  # Event of the refresh that is currently running, if any
+        self._refresher = None
+        self._listeners = []
+
+    def get(self):
+        """Return the current snapshot, only blocks when nothing has been fetched yet."""
+        snapshot = self._snapshot
+
+        if snapshot is None:
+            # Cold start, join the in-flight fetch instead of starting our own
+            self.refresh(wait=True)
+            snapshot = self._snapshot
+            return snapshot if snapshot else MarketSnapshot([], {}, 0)
+
+        if snapshot.age() >= self.ttl:
+            self.refresh()  # Serve stale while revalidating
+
+        return snapshot
+
+    def get_coins(self):
+        return self.get().coins
+
+    def dashboard(self):
+        """Return a TokenDashboard preloaded with the current snapshot so it never refetches the top 500."""
+        snapshot = self.get()
+        dashboard = TokenDashboard()
+        dashboard.coingecko_data = snapshot.coins
+        dashboard.symbol_to_id_map = snapshot.symbol_to_id_map
+        return dashboard
+
+    def refresh(self, wait=False):
+        """Start a refresh unless one is already running. With wait=True, block until it finished."""
+        with self._lock:
+            event = self._in_flight
+            if event is None:
+                event = threading.Event()
+                self._in_flight = event
+                threading.Thread(target=self._refresh, args=(event,), daemon=True).start()
+
+        if wait:
+            event.wait()
+
+    def _refresh(self, event):
+        try:
+            coordinator = get_coordinator()
+            if coordinator.is_leader():
+                self._fetch_and_share(coordinator)
+            else:
+                self._load_shared(coordinator)
+        except Exception:
+            logger.exception("Error refreshing market snapshot")
+        finally:
+            with self._lock:
+                self._in_flight = None
+            event.set()
+
+    def _fetch_and_share(self, coordinator):
+        dashboard = TokenDashboard()
+        coins = dashboard.coingecko_top500()
+
+        if not coins:
+            # Keep serving the previous snapshot rather than an empty table
+            logger.warning("Market snapshot refresh returned no data, keeping previous snapshot")
+            return
+
+        # Analytics scan all price histories, only the leader computes them and shares the result
+        price_matrix, metrics = self._compute_analytics(coins)
+
+        # Versions continue from the shared one, so they stay increasing when the leader changes
+        version = max(self._snapshot.version if self._snapshot else 0, coordinator.get("market_snapshot_version") or 0) + 1
+        # Tickers may contain "." or "$", which MongoDB does not accept as field names
+        coordinator.set("market_snapshot", {
+            "version": version,
+            "coins": coins,
+            "symbol_to_id_map": list(dashboard.symbol_to_id_map.items()),
+            "metrics": list(metrics.items()),
+        })
+        # Published separately, so the other workers can check for a new snapshot without loading it
+        coordinator.set("market_snapshot_version", version)
+        self._publish(coins, dashboard.symbol_to_id_map, version, price_matrix, metrics)
+
+    def _load_shared(self, coordinator):
+        version = coordinator.get("market_snapshot_version")
+        if version is None:
+            logger.info("No shared market snapshot yet, waiting for the leader")
+        elif self._snapshot is None or version != self._snapshot.version:
+            shared = coordinator.get("market_snapshot")
+            self._publish(
+                shared["coins"], dict(shared["symbol_to_id_map"]), shared["version"],
+                metrics=dict(shared["metrics"]),
+            )
+        else:
+            self._snapshot.fetched_at = time.time()  # Still current, check again after the TTL
+
+    def _publish(self, coins, symbol_to_id_map, version, price_matrix=None, metrics=None):
+        previous = self._snapshot
+        self._snapshot = MarketSnapshot(coins, symbol_to_id_map, version, price_matrix, metrics)
+        self._notify(previous, self._snapshot)
+        logger.info("Market snapshot refreshed", extra={"version": version, "coins": len(coins)})
+
+    def add_listener(self, callback):
+        """Call callback(previous, current) every time a new snapshot is published."""
+        self._listeners.append(callback)
+
+    def _notify(self, previous, current):
+        for callback in self._listeners:
+            try:
+                callback(previous, current)
+            except Exception:
+                logger.exception("Error in market snapshot listener")
+
+    @staticmethod
+    def _compute_analytics(coins):
+        """Build the price matrix and add the metric columns to the rows, a failure only skips analytics."""
+        try:
+            price_matrix = PriceMatrix.load()
+            metrics = price_matrix.metrics()
+            add_row_metrics(coins, metrics)
+            return price_matrix, metrics
+        except Exception:
+            logger.exception("Error computing analytics")
+            add_row_metrics(coins, {})
+            return None, {}
+
+    def start(self):
+        """Warm the snapshot and keep refreshing it every TTL seconds in a daemon thread."""
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while True:
+                self.refresh(wait=True)
+                # Poll quickly until the first snapshot is there, e.g. while another worker fetches it
+                time.sleep(self.ttl if self._snapshot else 1)
+
+        self._refresher = threading.Thread(target=loop, daemon=True)
+        self._refresher.start()
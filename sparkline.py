@@ -0,0 +1,145 @@
+from io import BytesIO
+
+from series import unpack_series
+
+
+# Display size of .chart-placeholder is 140x40, rendered at 2x so it stays sharp on HiDPI screens
+WIDTH = 280
+HEIGHT = 80
+SUPERSAMPLE = 2  # PIL lines are not anti-aliased, draw bigger and downscale
+
+UP_COLOR = "#10B981"
+DOWN_COLOR = "#EF4444"
+NEUTRAL_COLOR = "#D3D3D3"
+FILL_ALPHA = 0.2
+
+MIMETYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def chart_color(prices):
+    """Red for a falling chart, green for a rising one, light grey when flat."""
+    if prices[0] > prices[-1]:
+        return DOWN_COLOR
+    elif prices[0] < prices[-1]:
+        return UP_COLOR
+    return NEUTRAL_COLOR
+
+
+def y_range(prices):
+    """Padded y-axis limits so the line is centered in the chart."""
+    max_price = max(prices)
+    min_price = min(prices)
+    padding = (max_price - min_price) * 0.2
+    y_min = max(0, min_price - padding)
+    y_max = max_price + padding
+
+    if y_max == y_min:
+        # Flat series, give it some room so the line ends up in the middle
+        y_min, y_max = y_min - 1, y_max + 1
+    return y_min, y_max
+
+
+def _points(prices, timestamps, width, height):
+    """Map the series to pixel coordinates (origin top left)."""
+    if timestamps:
+        xs = [ts.timestamp() if hasattr(ts, "timestamp") else float(ts) for ts in timestamps]
+    else:
+        xs = list(range(len(prices)))
+
+    x_min, x_max = xs[0], xs[-1]
+    x_span = (x_max - x_min) or 1
+    y_min, y_max = y_range(prices)
+    y_span = y_max - y_min
+
+    return [
+        ((x - x_min) / x_span * (width - 1), (y_max - price) / y_span * (height - 1))
+        for x, price in zip(xs, prices)
+    ]
+
+
+def _hex_to_rgb(color):
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def render_png(prices, timestamps=None, width=WIDTH, height=HEIGHT):
+    """Render a sparkline with area fill straight into PNG bytes."""
+    # Imported here so the web process never loads PIL, only the render workers do
+    from PIL import Image, ImageDraw
+
+    canvas_w, canvas_h = width * SUPERSAMPLE, height * SUPERSAMPLE
+    rgb = _hex_to_rgb(chart_color(prices))
+    points = _points(prices, timestamps, canvas_w, canvas_h)
+
+    image = Image.new("RGBA", (canvas_w, canvas_h), (255, 255, 255, 0))
+    draw = ImageDraw.Draw(image)
+
+    # Area under the line, closed along the bottom edge
+    area = points + [(points[-1][0], canvas_h), (points[0][0], canvas_h)]
+    draw.polygon(area, fill=rgb + (int(255 * FILL_ALPHA),))
+    draw.line(points, fill=rgb + (255,), width=2 * SUPERSAMPLE, joint="curve")
+
+    if SUPERSAMPLE > 1:
+        image = image.resize((width, height), Image.LANCZOS)
+
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
+
+
+def render_svg(prices, timestamps=None, width=WIDTH, height=HEIGHT):
+    """Render the same sparkline as a small SVG document, returned as UTF-8 bytes."""
+    color = chart_color(prices)
+    points = _points(prices, timestamps, width, height)
+
+    line = "M" + " L".join(f"{x:.1f},{y:.1f}" for x, y in points)
+    area = f"{line} L{points[-1][0]:.1f},{height} L{points[0][0]:.1f},{height} Z"
+
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}" preserveAspectRatio="none">'
+        f'<path d="{area}" fill="{color}" fill-opacity="{FILL_ALPHA}" stroke="none"/>'
+        f'<path d="{line}" fill="none" stroke="{color}" stroke-width="2" '
+        f'stroke-linejoin="round" stroke-linecap="round"/>'
+        f"</svg>"
+    )
+    return svg.encode("utf-8")
+
+
+def render_sparkline(prices, timestamps=None, fmt="png", width=WIDTH, height=HEIGHT):
+    """
+    Render a 7d thumbnail chart into memory
+
+    Parameters:
+        prices (list): Price points, oldest first
+        timestamps (list): Optional datetimes (or epoch seconds) used for the x positions
+        fmt (str): "png" or "svg"
+        width (int): Output width in pixels
+        height (int): Output height in pixels
+
+    Returns:
+        bytes: The encoded image, or None when there are fewer than 2 points
+    """
+    if len(prices) < 2:
+        return None
+
+    if fmt == "png":
+        return render_png(prices, timestamps, width, height)
+    elif fmt == "svg":
+        return render_svg(prices, timestamps, width, height)
+    raise ValueError(f"Unsupported chart format: {fmt}")
+
+
+def render_history(job):
+    """
+    Process pool entry point, renders one price_history series
+
+    Parameters:
+        job (tuple): (symbol, packed epoch ms timestamps, packed prices, fmt)
+
+    Returns:
+        tuple: (symbol, encoded image bytes or None)
+    """
+    symbol, timestamps_blob, prices_blob, fmt = job
+    timestamps, prices = unpack_series(timestamps_blob, prices_blob)
+    return symbol, render_sparkline(prices.tolist(), (timestamps / 1000).tolist(), fmt=fmt)
@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+
+# The modules live at the repository root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Stand-in for the time module with a monotonic clock the test advances by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def make_series():
+    """Build (timestamps, prices) arrays in the stored dtypes from plain sequences."""
+    from series import PRICE_DTYPE, TIMESTAMP_DTYPE
+
+    def build(timestamps, prices):
+        return np.array(timestamps, dtype=TIMESTAMP_DTYPE), np.array(prices, dtype=PRICE_DTYPE)
+
+    return build
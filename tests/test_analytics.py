@@ -0,0 +1,89 @@
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+from analytics import HOUR_MS, PriceMatrix, _forward_fill, add_row_metrics
+
+
+A = [100, 110, 99, 121, 110]
+B = [10, 10, 10, 10, 20]
+
+
+@pytest.fixture
+def matrix():
+    timestamps = np.arange(len(A), dtype=np.int64) * HOUR_MS
+    prices = np.column_stack([A, B, [2 * price for price in A]]).astype(float)
+    return PriceMatrix(timestamps, ["A", "B", "C"], prices)
+
+
+def test_forward_fill_keeps_leading_gaps():
+    prices = np.array([[np.nan, 1.0], [2.0, np.nan], [np.nan, np.nan], [3.0, 4.0]])
+    filled = _forward_fill(prices)
+
+    assert np.isnan(filled[0, 0])
+    assert filled[:, 1].tolist() == [1, 1, 1, 4]
+    assert filled[1:, 0].tolist() == [2, 2, 3]
+
+
+def test_returns(matrix):
+    assert matrix.returns(None).tolist() == pytest.approx([10, 100, 10])
+    assert matrix.returns(2 * HOUR_MS).tolist() == pytest.approx([(110 / 99 - 1) * 100, 100, (110 / 99 - 1) * 100])
+
+
+def test_volatility(matrix):
+    log_returns = [math.log(b / a) for a, b in zip(A, A[1:])]
+    expected = statistics.stdev(log_returns) * math.sqrt(24 * 365) * 100
+
+    volatility = matrix.volatility()
+    assert volatility[0] == pytest.approx(expected)
+    assert volatility[2] == pytest.approx(expected)  # Scaling the prices does not change it
+    assert math.isnan(matrix.volatility(HOUR_MS)[0])  # One return is not enough
+
+
+def test_drawdown(matrix):
+    max_drawdown, current = matrix.drawdown()
+
+    assert max_drawdown.tolist() == pytest.approx([10, 0, 10])
+    assert current.tolist() == pytest.approx([(1 - 110 / 121) * 100, 0, (1 - 110 / 121) * 100])
+
+
+def test_correlation(matrix):
+    symbols, correlation = matrix.correlation(["A", "C", "X"])
+
+    assert symbols == ["A", "C"]
+    assert correlation.ravel().tolist() == pytest.approx([1, 1, 1, 1])
+
+
+def test_metrics_per_window(matrix):
+    metrics = matrix.metrics((2, 4))
+
+    assert set(metrics) == {"A", "B", "C"}
+    assert set(metrics["A"]) == {
+        "return_2h", "volatility_2h", "max_drawdown_2h", "return_4h", "volatility_4h", "max_drawdown_4h", "drawdown",
+    }
+    assert metrics["B"]["return_4h"] == pytest.approx(100)
+    assert metrics["A"]["max_drawdown_2h"] == pytest.approx((1 - 110 / 121) * 100)
+
+
+def test_metrics_are_cached_per_window_tuple(matrix):
+    assert matrix.metrics((2, 4)) is matrix.metrics([2, 4])
+    assert matrix.metrics((2,)) is not matrix.metrics((2, 4))
+
+
+def test_missing_values_are_null():
+    timestamps = np.arange(3, dtype=np.int64) * HOUR_MS
+    prices = np.array([[1.0, np.nan], [2.0, np.nan], [4.0, 5.0]])
+    metrics = PriceMatrix(timestamps, ["A", "B"], prices).metrics((24,))
+
+    assert metrics["A"]["return_24h"] == pytest.approx(300)
+    assert metrics["B"]["return_24h"] is None
+
+
+def test_add_row_metrics():
+    coins = [{"symbol": "a"}, {"symbol": "z"}]
+    add_row_metrics(coins, {"A": {"volatility_168h": 1.5, "max_drawdown_168h": 2.0, "drawdown": 0.5}})
+
+    assert coins[0] == {"symbol": "a", "volatility_7d": 1.5, "max_drawdown_7d": 2.0, "drawdown": 0.5}
+    assert coins[1] == {"symbol": "z", "volatility_7d": None, "max_drawdown_7d": None, "drawdown": None}
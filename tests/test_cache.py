@@ -0,0 +1,166 @@
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import ByteLRUCache, TTLCache, single_flight
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(cache, "time", clock)
+
+
+def test_byte_cache_hit_and_miss():
+    store = ByteLRUCache(max_bytes=100, ttl=60)
+    store.set("a", b"12345")
+
+    assert store.get("a") == b"12345"
+    assert store.get("b") is None
+    assert store.stats() == {"entries": 1, "bytes": 5, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_byte_cache_evicts_least_recently_used(clock):
+    store = ByteLRUCache(max_bytes=10, ttl=60)
+    store.set("a", b"1234")
+    store.set("b", b"1234")
+    store.get("a")
+    store.set("c", b"1234")
+
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+    assert store.stats()["bytes"] == 8 and store.stats()["evictions"] == 1
+
+
+def test_byte_cache_skips_oversized_values():
+    store = ByteLRUCache(max_bytes=4, ttl=60)
+    store.set("a", b"12")
+    store.set("b", b"12345")
+
+    assert store.get("a") is not None and store.get("b") is None
+
+
+def test_byte_cache_replace():
+    store = ByteLRUCache(max_bytes=100, ttl=60)
+    store.set("a", b"12")
+    store.set("a", b"1234")
+
+    assert store.get("a") == b"1234"
+    assert store.stats()["bytes"] == 4
+
+
+def test_byte_cache_expires(clock):
+    store = ByteLRUCache(max_bytes=100, ttl=60)
+    store.set("a", b"12")
+    clock.advance(61)
+
+    assert store.get("a") is None
+    assert store.stats()["entries"] == 0 and store.stats()["bytes"] == 0
+
+
+def test_ttl_cache_loads_once_while_fresh(clock):
+    store = TTLCache(max_entries=10, ttl=60, stale_ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert store.get("a", loader) == 1
+    clock.advance(30)
+    assert store.get("a", loader) == 1
+    assert len(calls) == 1
+    assert store.stats()["hits"] == 1 and store.stats()["misses"] == 1
+
+
+def test_ttl_cache_serves_stale_while_refreshing(clock):
+    store = TTLCache(max_entries=10, ttl=60, stale_ttl=60)
+    store.set("a", "old")
+    clock.advance(90)
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return "new"
+
+    assert store.get("a", loader) == "old"
+    assert refreshed.wait(5)
+    for _ in range(100):
+        if store.peek("a") == "new":
+            break
+        time.sleep(0.01)
+
+    assert store.peek("a") == "new"
+    assert store.stats()["stale_hits"] == 1
+
+
+def test_ttl_cache_reloads_expired_entries(clock):
+    store = TTLCache(max_entries=10, ttl=60, stale_ttl=60)
+    store.set("a", "old")
+    clock.advance(121)
+
+    assert store.get("a", lambda: "new") == "new"
+    assert store.stats()["misses"] == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    store = TTLCache(max_entries=2, ttl=60, stale_ttl=0)
+    store.set("a", 1)
+    store.set("b", 2)
+    store.get("a", lambda: None)
+    store.set("c", 3)
+
+    assert store.peek("b") is None
+    assert store.peek("a") == 1 and store.peek("c") == 3
+    assert store.stats()["evictions"] == 1
+
+
+def coalesced():
+    return dict(((labels["kind"], value) for _, labels, value in cache.COALESCED_FETCHES.samples())).get("test", 0)
+
+
+def test_single_flight_shares_one_call():
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    coalesced_before = coalesced()
+    first = threading.Thread(target=lambda: results.append(single_flight(("test", "a"), fetch)))
+    first.start()
+    assert started.wait(5)
+
+    others = [
+        threading.Thread(target=lambda: results.append(single_flight(("test", "a"), fetch))) for _ in range(4)
+    ]
+    for thread in others:
+        thread.start()
+    # The followers are waiting on the leader's future before it is released
+    for _ in range(100):
+        if coalesced() >= coalesced_before + 4:
+            break
+        time.sleep(0.01)
+
+    release.set()
+    for thread in [first, *others]:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == ["value"] * 5
+    assert ("test", "a") not in cache._in_flight
+
+
+def test_single_flight_propagates_errors_and_forgets_them():
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        single_flight(("test", "b"), fail)
+
+    assert ("test", "b") not in cache._in_flight
+    assert single_flight(("test", "b"), lambda: "recovered") == "recovered"
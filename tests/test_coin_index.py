@@ -0,0 +1,65 @@
+import pytest
+
+from coin_index import CoinIndex
+
+
+def coin(id, symbol, rank, price):
+    row = {field: None for field in CoinIndex.SORT_FIELDS.values()}
+    row.update(id=id, symbol=symbol, market_cap_rank=rank, current_price=price)
+    return row
+
+
+@pytest.fixture
+def index():
+    return CoinIndex([
+        coin("bitcoin", "btc", 1, 60000.0),
+        coin("ethereum", "eth", 2, 3000.0),
+        coin("bitcoin cash", "bch", 3, None),
+        coin("bitcoin-wrapped", "btc", None, 59000.0),
+    ])
+
+
+def ids(rows):
+    return [row["id"] for row in rows]
+
+
+def test_get_resolves_duplicate_tickers_to_highest_rank(index):
+    assert index.get("BTC")["id"] == "bitcoin"
+    assert index.get("doge") is None
+
+
+def test_search_by_symbol_and_name_prefix(index):
+    total, rows = index.query(q="bit")
+    assert total == 3
+    assert ids(rows) == ["bitcoin", "bitcoin cash", "bitcoin-wrapped"]
+
+    assert ids(index.query(q="cash")[1]) == ["bitcoin cash"]
+    assert ids(index.query(q="ETH")[1]) == ["ethereum"]
+
+
+def test_long_query_is_filtered_beyond_the_prefix_index(index):
+    assert ids(index.query(q="bitcoin-w")[1]) == ["bitcoin-wrapped"]
+    assert index.query(q="bitcoin-x") == (0, [])
+
+
+def test_sort_puts_missing_values_last(index):
+    assert ids(index.query(sort="price", order="asc")[1]) == ["ethereum", "bitcoin-wrapped", "bitcoin", "bitcoin cash"]
+    assert ids(index.query(sort="price", order="desc")[1]) == ["bitcoin", "bitcoin-wrapped", "ethereum", "bitcoin cash"]
+    assert ids(index.query(sort="rank", order="desc")[1])[-1] == "bitcoin-wrapped"
+
+
+def test_pagination(index):
+    total, rows = index.query(sort="rank", offset=1, limit=2)
+    assert total == 4
+    assert ids(rows) == ["ethereum", "bitcoin cash"]
+
+    total, rows = index.query(q="bit", sort="price", order="desc", offset=2, limit=5)
+    assert total == 3
+    assert ids(rows) == ["bitcoin cash"]
+
+
+def test_unknown_sort_key(index):
+    with pytest.raises(ValueError):
+        index.query(sort="name")
+    with pytest.raises(ValueError):
+        index.query(order="up")
@@ -0,0 +1,80 @@
+import pytest
+
+import coordination
+from coordination import BACKGROUND_LEASE, Coordinator, LocalBackend
+
+
+@pytest.fixture(autouse=True)
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(coordination, "time", clock)
+
+
+def test_lease_is_exclusive_until_it_expires(clock):
+    backend = LocalBackend()
+
+    assert backend.acquire("job", "a", ttl=30)
+    assert not backend.acquire("job", "b", ttl=30)
+
+    clock.advance(31)
+    assert backend.acquire("job", "b", ttl=30)
+    assert not backend.acquire("job", "a", ttl=30)
+
+
+def test_holder_renews_its_lease(clock):
+    backend = LocalBackend()
+    backend.acquire("job", "a", ttl=30)
+
+    clock.advance(20)
+    assert backend.acquire("job", "a", ttl=30)
+    clock.advance(20)
+    assert not backend.acquire("job", "b", ttl=30)
+
+
+def test_release_only_by_holder():
+    backend = LocalBackend()
+    backend.acquire("job", "a", ttl=30)
+
+    backend.release("job", "b")
+    assert not backend.acquire("job", "b", ttl=30)
+
+    backend.release("job", "a")
+    assert backend.acquire("job", "b", ttl=30)
+
+
+def test_lease_context_releases_on_exit():
+    first, second = Coordinator(backend="local"), Coordinator(backend="local")
+    second.backend = first.backend  # Two workers sharing one backend
+
+    with first.lease("categories:bitcoin", ttl=30) as acquired:
+        assert acquired
+        with second.lease("categories:bitcoin", ttl=30) as acquired_too:
+            assert not acquired_too
+
+    with second.lease("categories:bitcoin", ttl=30) as acquired:
+        assert acquired
+
+
+def test_leadership_moves_when_the_leader_stops_renewing(clock):
+    first, second = Coordinator(backend="local", lease_ttl=60), Coordinator(backend="local", lease_ttl=60)
+    second.backend = first.backend
+
+    assert first.is_leader()
+    assert not second.is_leader()
+
+    clock.advance(61)
+    assert second.is_leader()
+    assert not first.is_leader()
+    assert first.backend._leases[BACKGROUND_LEASE][0] == second.owner
+
+
+def test_shared_values():
+    coordinator = Coordinator(backend="local")
+
+    assert coordinator.get("market-snapshot") is None
+    coordinator.set("market-snapshot", {"version": 1})
+    assert coordinator.get("market-snapshot") == {"version": 1}
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Coordinator(backend="redis")
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("mongomock")
+
+from mongoengine import disconnect
+
+import db
+from models import PriceHistory
+
+
+@pytest.fixture
+def mongomock_uri(monkeypatch):
+    def use(uri):
+        monkeypatch.setenv("MONGODB_URI", uri)
+        monkeypatch.setattr(db, "_client", None)
+        db.connect_mongoengine()
+
+    yield use
+    disconnect()
+
+
+@pytest.mark.parametrize("uri, name", [
+    ("mongomock://localhost/?retryWrites=true", "crypto_tracker"),
+    ("mongomock://localhost/other", "other"),
+])
+def test_models_use_the_application_database(mongomock_uri, uri, name):
+    mongomock_uri(uri)
+
+    assert db.get_database().name == name
+    assert PriceHistory._get_db().name == name
+
+
+def test_models_share_the_client(mongomock_uri):
+    mongomock_uri("mongomock://localhost/crypto_tracker")
+    PriceHistory(symbol="BTC", name="bitcoin").save()
+
+    assert PriceHistory._get_db().client is db.get_mongo_client()
+    assert db.get_collection("price_history").count_documents({"symbol": "BTC"}) == 1
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+from live import LIVE_FIELDS, diff_snapshots
+
+
+def coin(symbol, price, rank):
+    row = dict.fromkeys(LIVE_FIELDS, 0.0)
+    row.update(symbol=symbol, current_price=price, market_cap_rank=rank)
+    return row
+
+
+def snapshot(*coins):
+    return SimpleNamespace(coins=list(coins))
+
+
+def test_unchanged_snapshot_has_no_changes():
+    coins = [coin("btc", 100.0, 1), coin("eth", 10.0, 2)]
+    assert diff_snapshots(snapshot(*coins), snapshot(*[dict(row) for row in coins])) == []
+
+
+def test_changed_fields_only():
+    changes = diff_snapshots(
+        snapshot(coin("btc", 100.0, 1), coin("eth", 10.0, 2)),
+        snapshot(coin("btc", 101.0, 1), coin("eth", 10.0, 2)),
+    )
+    assert changes == [{"symbol": "btc", "current_price": 101.0}]
+
+
+def test_rank_moves_carry_the_previous_rank():
+    changes = diff_snapshots(
+        snapshot(coin("btc", 100.0, 1), coin("eth", 10.0, 2)),
+        snapshot(coin("eth", 10.0, 1), coin("btc", 100.0, 2)),
+    )
+    assert changes == [
+        {"symbol": "eth", "market_cap_rank": 1, "previous_rank": 2},
+        {"symbol": "btc", "market_cap_rank": 2, "previous_rank": 1},
+    ]
+
+
+def test_added_coin_sends_all_fields():
+    changes = diff_snapshots(snapshot(coin("btc", 100.0, 1)), snapshot(coin("btc", 100.0, 1), coin("sol", 5.0, 2)))
+
+    assert changes == [{"symbol": "sol", **{field: coin("sol", 5.0, 2)[field] for field in LIVE_FIELDS}}]
+
+
+def test_removed_coin_sends_nothing():
+    # Its row stays on the page until the table is reloaded
+    changes = diff_snapshots(snapshot(coin("btc", 100.0, 1), coin("eth", 10.0, 2)), snapshot(coin("btc", 100.0, 1)))
+    assert changes == []
+
+
+def test_duplicated_ticker_follows_the_highest_ranked_coin():
+    changes = diff_snapshots(
+        snapshot(coin("btc", 100.0, 1), coin("btc", 1.0, 300)),
+        snapshot(coin("btc", 100.0, 1), coin("btc", 2.0, 300)),
+    )
+    assert changes == []
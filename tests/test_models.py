@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from mongoengine import connect, disconnect
+
+from models import PriceHistory
+from series import SPARKLINE_POINTS, doc_sparkline
+
+
+HOUR = 3_600_000
+
+
+@pytest.fixture(autouse=True)
+def database():
+    connect(
+        "crypto_tracker", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient,
+        uuidRepresentation="standard",
+    )
+    yield
+    PriceHistory.drop_collection()
+    disconnect()
+
+
+def stored_record(timestamps, prices):
+    record = PriceHistory(symbol="BTC", name="bitcoin")
+    record.set_series(timestamps, prices)
+    record.save()
+    return PriceHistory.objects(symbol="BTC").first()
+
+
+def test_rollups_survive_a_reload():
+    timestamps = np.arange(0, 48 * HOUR, HOUR // 4)
+    record = stored_record(timestamps, np.arange(len(timestamps), dtype=float))
+
+    hourly = record.get_rollup("1h")
+    assert hourly.shape == (48, 5)
+    assert hourly[1].tolist() == [HOUR, 4, 7, 4, 7]
+    assert record.get_rollup("1d")[:, 4].tolist() == [95, 191]
+    assert record.get_rollup("sparkline").shape == (SPARKLINE_POINTS, 2)
+
+
+def test_doc_sparkline_reads_the_stored_rollup():
+    timestamps = np.arange(0, 48 * HOUR, HOUR // 4)
+    stored_record(timestamps, np.arange(len(timestamps), dtype=float))
+
+    doc = PriceHistory._get_collection().find_one({"symbol": "BTC"}, {"rollups.sparkline": 1})
+    spark_timestamps, spark_prices = doc_sparkline(doc)
+
+    assert len(spark_timestamps) == SPARKLINE_POINTS
+    assert spark_timestamps[0] == 0 and spark_timestamps[-1] == timestamps[-1]
+    assert spark_prices[-1] == len(timestamps) - 1
+
+
+def test_rollups_written_as_byte_lists_are_still_read():
+    timestamps = np.arange(0, 4 * HOUR, HOUR // 4)
+    record = stored_record(timestamps, np.arange(len(timestamps), dtype=float))
+    blob = bytes(record.rollups["1h"])
+    PriceHistory._get_collection().update_one({"symbol": "BTC"}, {"$set": {"rollups.1h": list(blob)}})
+
+    doc = PriceHistory._get_collection().find_one({"symbol": "BTC"})
+    assert PriceHistory._from_son(doc).get_rollup("1h").tobytes() == blob
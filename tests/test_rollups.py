@@ -0,0 +1,78 @@
+import numpy as np
+
+from series import (
+    OHLC_COLUMNS, ROLLUP_INTERVALS, compute_rollups, lttb, ohlc, rollup_columns, unpack_rollup,
+)
+
+
+HOUR = 3_600_000
+
+
+def test_ohlc_buckets(make_series):
+    timestamps, prices = make_series([0, HOUR // 2, HOUR, HOUR + 1, 3 * HOUR], [5, 7, 3, 1, 9])
+    matrix = ohlc(timestamps, prices, HOUR)
+
+    assert matrix.tolist() == [
+        [0, 5, 7, 5, 7],
+        [HOUR, 3, 3, 1, 1],
+        [3 * HOUR, 9, 9, 9, 9],  # Empty buckets are skipped
+    ]
+
+
+def test_ohlc_empty(make_series):
+    assert ohlc(*make_series([], []), HOUR).shape == (0, len(OHLC_COLUMNS))
+
+
+def test_lttb_keeps_end_points_and_size(make_series):
+    timestamps, prices = make_series(range(1000), np.sin(np.arange(1000) / 50))
+    sampled_timestamps, sampled_prices = lttb(timestamps, prices, 50)
+
+    assert len(sampled_timestamps) == len(sampled_prices) == 50
+    assert sampled_timestamps[0] == 0 and sampled_timestamps[-1] == 999
+    assert np.all(np.diff(sampled_timestamps) > 0)
+
+
+def test_lttb_keeps_peak(make_series):
+    prices = np.zeros(100)
+    prices[37] = 10
+    sampled_timestamps, _ = lttb(*make_series(range(100), prices), 10)
+
+    assert 37 in sampled_timestamps.tolist()
+
+
+def test_lttb_short_series_unchanged(make_series):
+    timestamps, prices = make_series([1, 2, 3], [1, 2, 3])
+    assert lttb(timestamps, prices, 10)[0] is timestamps
+
+
+def test_compute_rollups_roundtrip(make_series):
+    timestamps, prices = make_series(range(0, 48 * HOUR, HOUR // 4), np.arange(192, dtype=float))
+    rollups = compute_rollups(timestamps, prices, 20)
+
+    assert set(rollups) == {*ROLLUP_INTERVALS, "sparkline"}
+    assert unpack_rollup(rollups["1h"], "1h").shape == (48, 5)
+    assert unpack_rollup(rollups["4h"], "4h").shape == (12, 5)
+    assert unpack_rollup(rollups["1d"], "1d").shape == (2, 5)
+
+    sparkline = unpack_rollup(rollups["sparkline"], "sparkline")
+    assert sparkline.shape == (20, 2)
+    assert sparkline[0].tolist() == [0, 0] and sparkline[-1].tolist() == [timestamps[-1], 191]
+
+    columns = rollup_columns(unpack_rollup(rollups["1d"], "1d"), "1d")
+    assert columns["o"] == [0, 96] and columns["c"] == [95, 191]
+    assert columns["h"] == [95, 191] and columns["l"] == [0, 96]
+
+
+def test_unpack_missing_rollup():
+    assert unpack_rollup(None, "1h").shape == (0, 5)
+    assert unpack_rollup(b"", "sparkline").shape == (0, 2)
+
+
+def test_rollup_max_age_follows_the_bucket_size():
+    from utils import HISTORY_REFRESH_HOURS, rollup_max_age_ms
+
+    refresh_ms = HISTORY_REFRESH_HOURS * HOUR
+    assert rollup_max_age_ms("1h") == min(HOUR, refresh_ms)
+    assert rollup_max_age_ms("4h") == min(4 * HOUR, refresh_ms)
+    assert rollup_max_age_ms("1d") == refresh_ms
+    assert rollup_max_age_ms("sparkline") == refresh_ms
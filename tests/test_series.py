@@ -0,0 +1,64 @@
+from series import PRICE_DTYPE, TIMESTAMP_DTYPE, merge_series, pack_series, unpack_series
+
+
+DAY = 24 * 3_600_000
+
+
+def test_pack_roundtrip():
+    timestamps, prices = unpack_series(*pack_series([1, 2, 3], [1.5, 2.5, 3.5]))
+
+    assert timestamps.dtype == TIMESTAMP_DTYPE and prices.dtype == PRICE_DTYPE
+    assert timestamps.tolist() == [1, 2, 3]
+    assert prices.tolist() == [1.5, 2.5, 3.5]
+
+
+def test_unpack_empty():
+    timestamps, prices = unpack_series(b"", b"")
+    assert len(timestamps) == 0 and len(prices) == 0
+
+
+def test_merge_appends_newer_points(make_series):
+    timestamps, prices = merge_series(*make_series([1, 2], [10, 20]), *make_series([3, 4], [30, 40]), DAY, 4)
+
+    assert timestamps.tolist() == [1, 2, 3, 4]
+    assert prices.tolist() == [10, 20, 30, 40]
+
+
+def test_merge_drops_overlapping_window(make_series):
+    # The fetched window overlaps the stored series, stored prices are kept
+    timestamps, prices = merge_series(*make_series([1, 2, 3], [10, 20, 30]), *make_series([2, 3, 4], [99, 99, 40]), DAY, 4)
+
+    assert timestamps.tolist() == [1, 2, 3, 4]
+    assert prices.tolist() == [10, 20, 30, 40]
+
+
+def test_merge_dedupes_and_sorts_new_points(make_series):
+    # The first occurrence of a duplicated timestamp wins
+    timestamps, prices = merge_series(*make_series([], []), *make_series([3, 1, 3, 2], [30, 10, 99, 20]), DAY, 3)
+
+    assert timestamps.tolist() == [1, 2, 3]
+    assert prices.tolist() == [10, 20, 30]
+
+
+def test_merge_sorts_out_of_order_stored_series(make_series):
+    timestamps, prices = merge_series(*make_series([2, 1], [20, 10]), *make_series([3], [30]), DAY, 3)
+
+    assert timestamps.tolist() == [1, 2, 3]
+    assert prices.tolist() == [10, 20, 30]
+
+
+def test_merge_applies_retention(make_series):
+    now = 10 * DAY
+    timestamps, prices = merge_series(
+        *make_series([now - 3 * DAY, now - DAY], [1, 2]), *make_series([now], [3]), 2 * DAY, now
+    )
+
+    assert timestamps.tolist() == [now - DAY, now]
+    assert prices.tolist() == [2, 3]
+
+
+def test_merge_keeps_dtypes(make_series):
+    timestamps, prices = merge_series(*make_series([], []), *make_series([], []), DAY, 0)
+
+    assert timestamps.dtype == TIMESTAMP_DTYPE and prices.dtype == PRICE_DTYPE
+    assert len(timestamps) == 0
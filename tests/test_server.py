@@ -0,0 +1,56 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from flask import Flask
+
+import server
+
+
+@pytest.fixture
+def client(monkeypatch):
+    tracked = {"BTC": ([1, 2], [10.0, 20.0]), "ETH": ([1], [3.0])}
+    monkeypatch.setattr(server, "is_tracked", lambda symbol: symbol in tracked)
+    monkeypatch.setattr(
+        server, "load_price_series",
+        lambda symbol: (np.array(tracked[symbol][0], dtype=np.int64), np.array(tracked[symbol][1])),
+    )
+
+    app = Flask(__name__)
+    app.register_blueprint(server.bp)
+    return app.test_client()
+
+
+def test_price_charts_serves_known_symbols_next_to_unknown_ones(client):
+    response = client.get("/api/price-charts?symbols=BTC,NOPE,ETH")
+
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "BTC": {"t": [1, 2], "p": [10.0, 20.0]},
+        "NOPE": None,
+        "ETH": {"t": [1], "p": [3.0]},
+    }
+
+
+def test_price_charts_requires_symbols(client):
+    assert client.get("/api/price-charts").status_code == 400
+
+
+def test_one_request_only_uses_its_share_of_the_pool():
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def load(item):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        return item * 2
+
+    assert server.map_price_charts(load, range(12)) == [item * 2 for item in range(12)]
+    assert peak <= server.PRICE_CHARTS_REQUEST_WORKERS
@@ -0,0 +1,55 @@
+from coin_index import CoinIndex
+from coordination import Coordinator
+from snapshot import MarketSnapshotStore
+
+
+def coin(id, symbol):
+    return {**dict.fromkeys(CoinIndex.SORT_FIELDS.values()), "id": id, "symbol": symbol}
+
+
+class CountingCoordinator(Coordinator):
+    def __init__(self):
+        super().__init__(backend="local")
+        self.reads = []
+
+    def get(self, key):
+        self.reads.append(key)
+        return super().get(key)
+
+
+def share(coordinator, version, coins):
+    coordinator.set("market_snapshot", {
+        "version": version,
+        "coins": coins,
+        "symbol_to_id_map": [(coin["symbol"].upper(), coin["id"]) for coin in coins],
+        "metrics": [],
+    })
+    coordinator.set("market_snapshot_version", version)
+
+
+def test_follower_loads_the_snapshot_only_when_the_version_changed():
+    coordinator = CountingCoordinator()
+    store = MarketSnapshotStore(ttl=60)
+    share(coordinator, 1, [coin("bitcoin", "btc")])
+
+    store._load_shared(coordinator)
+    assert store._snapshot.version == 1
+    assert store._snapshot.symbol_to_id_map == {"BTC": "bitcoin"}
+    assert coordinator.reads == ["market_snapshot_version", "market_snapshot"]
+
+    coordinator.reads.clear()
+    store._load_shared(coordinator)
+    assert coordinator.reads == ["market_snapshot_version"]
+
+    share(coordinator, 2, [coin("ethereum", "eth")])
+    store._load_shared(coordinator)
+    assert store._snapshot.version == 2
+    assert store._snapshot.symbol_to_id_map == {"ETH": "ethereum"}
+
+
+def test_follower_waits_for_the_leader():
+    coordinator = CountingCoordinator()
+    store = MarketSnapshotStore(ttl=60)
+
+    store._load_shared(coordinator)
+    assert store._snapshot is None
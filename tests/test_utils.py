@@ -0,0 +1,97 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mongomock")
+
+from mongoengine import disconnect
+
+import db
+from models import PriceHistory
+from utils import iter_sparklines, top_symbols
+
+
+HOUR = 3_600_000
+
+
+@pytest.fixture(autouse=True)
+def database(monkeypatch):
+    monkeypatch.setenv("MONGODB_URI", "mongomock://localhost/crypto_tracker")
+    monkeypatch.setattr(db, "_client", None)
+    db.connect_mongoengine()
+    yield
+    disconnect()
+
+
+def store(symbol, last_price):
+    timestamps = np.arange(0, 24 * HOUR, HOUR)
+    record = PriceHistory(symbol=symbol, name=symbol.lower())
+    record.set_series(timestamps, np.linspace(1, last_price, len(timestamps)))
+    record.save()
+
+
+def test_top_symbols_in_rank_order_without_duplicates():
+    coins = [{"symbol": "btc"}, {"symbol": "eth"}, {"symbol": "btc"}, {"symbol": "sol"}, {"symbol": "ada"}]
+
+    assert top_symbols(coins, 3) == ["BTC", "ETH", "SOL"]
+    assert top_symbols(coins, 10) == ["BTC", "ETH", "SOL", "ADA"]
+
+
+def test_iter_sparklines_follows_the_requested_order():
+    for symbol, last_price in (("DOGE", 3), ("ETH", 2), ("BTC", 1)):
+        store(symbol, last_price)
+
+    sparklines = list(iter_sparklines(["BTC", "ETH", "SOL"]))
+
+    assert [symbol for symbol, _, _ in sparklines] == ["BTC", "ETH"]  # SOL has no history, DOGE is not asked for
+    assert [prices[-1] for _, _, prices in sparklines] == [1, 2]
+
+
+def test_iter_sparklines_downsamples_documents_without_rollups():
+    store("BTC", 5)
+    db.get_collection("price_history").update_one({"symbol": "BTC"}, {"$unset": {"rollups": ""}})
+
+    [(symbol, timestamps, prices)] = iter_sparklines(["BTC"])
+
+    assert symbol == "BTC"
+    assert len(timestamps) == 24 and prices[-1] == 5
+
+
+class FakeResponse:
+    def __init__(self, status_code, prices=()):
+        self.status_code = status_code
+        self._prices = [list(point) for point in prices]
+
+    def json(self):
+        return {"prices": self._prices}
+
+
+def backfill_dashboard(monkeypatch, response):
+    import utils
+
+    monkeypatch.setattr(utils, "coingecko_get", lambda url, headers, params: response)
+    dashboard = utils.TokenDashboard()
+    dashboard.coingecko_data = [{"symbol": "btc"}]
+    dashboard.symbol_to_id_map = {"BTC": "bitcoin"}
+    return dashboard
+
+
+def test_backfill_does_not_complete_a_failed_refresh(monkeypatch, tmp_path):
+    store("BTC", 5)  # Stale history, the failed request falls back to it
+    state_file = tmp_path / "state.json"
+    dashboard = backfill_dashboard(monkeypatch, FakeResponse(500))
+
+    assert dashboard.initialize_price_history_data(limit=1, state_file=str(state_file)) == (0, 1)
+    assert not state_file.exists()
+
+
+def test_backfill_completes_a_refresh(monkeypatch, tmp_path):
+    now_ms = int(time.time() * 1000)
+    state_file = tmp_path / "state.json"
+    dashboard = backfill_dashboard(monkeypatch, FakeResponse(200, [(now_ms - HOUR, 1.0), (now_ms, 2.0)]))
+
+    assert dashboard.initialize_price_history_data(limit=1, state_file=str(state_file)) == (1, 0)
+    assert json.loads(state_file.read_text())["completed"] == ["BTC"]
+    assert PriceHistory.objects(symbol="BTC").first().point_count == 2
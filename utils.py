@@ -1,22 +1,82 @@
+import logging
 import os
-from socketserver import DatagramRequestHandler
 
 import requests
 from dotenv import load_dotenv
 from datetime import datetime
 import time
 from models import PriceHistory
-from pymongo import MongoClient
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import base64
-from io import BytesIO
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import threading
+
+from cache import single_flight
+from chart_store import get_chart_store
+from coordination import get_coordinator
+from db import get_collection
+from http_client import COINGECKO_API_URL, coingecko_get, coingecko_limiter
+from series import ROLLUP_INTERVALS, SPARKLINE_POINTS, compute_rollups, doc_sparkline, merge_series, pack_series, series_to_history, unpack_rollup, unpack_series
 
 
 # Load environment variables from .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Price history is refreshed once the newest point is this old, and kept for the retention window
+HISTORY_REFRESH_HOURS = int(os.getenv("HISTORY_REFRESH_HOURS", 4))
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", 7))
+
+# Row field -> CoinGecko markets field, all converted to float
+MARKET_FLOAT_FIELDS = {
+    "current_price": "current_price",
+    "price_change_percentage_24": "price_change_percentage_24h",
+    "price_change_percentage_1h": "price_change_percentage_1h_in_currency",
+    "price_change_percentage_7d": "price_change_percentage_7d_in_currency",
+    "price_change_percentage_30d": "price_change_percentage_30d_in_currency",
+    "total_volume": "total_volume",
+    "market_cap": "market_cap",
+}
+
+
+def top_symbols(coins, limit):
+    """Tickers of the first `limit` coins in market cap order, a duplicated ticker counts once."""
+    return list(dict.fromkeys(coin["symbol"].upper() for coin in coins))[:limit]
+
+
+def iter_sparklines(symbols):
+    """
+    Yield (symbol, timestamps, prices) of the stored sparkline rollups, in the order of symbols
+
+    Symbols without a stored history are skipped. Only documents stored before rollups existed
+    are read again with their raw series, which is then downsampled on the fly.
+    """
+    collection = get_collection("price_history")
+    docs = {
+        doc["symbol"]: doc
+        for doc in collection.find({"symbol": {"$in": list(symbols)}}, {"symbol": 1, "rollups.sparkline": 1})
+    }
+    for symbol in symbols:
+        doc = docs.get(symbol)
+        if doc is None:
+            continue
+        if not (doc.get("rollups") or {}).get("sparkline"):
+            doc = collection.find_one({"_id": doc["_id"]}, {"symbol": 1, "history": 1, "timestamps": 1, "prices": 1})
+        yield (doc["symbol"], *doc_sparkline(doc))
+
+
+def rollup_max_age_ms(resolution):
+    """
+    Age of the newest point from which a stored rollup is refreshed
+
+    An OHLC rollup is refreshed once a whole bucket of points is missing, at the latest after
+    HISTORY_REFRESH_HOURS like the raw series: hourly for "1h", every HISTORY_REFRESH_HOURS
+    for "4h", "1d" and the sparkline.
+    """
+    refresh_ms = HISTORY_REFRESH_HOURS * 3_600_000
+    return min(ROLLUP_INTERVALS.get(resolution, refresh_ms), refresh_ms)
+
 
 class TokenDashboard:
     """This class handles cryptocurrency data fetching and processing."""
@@ -32,85 +92,112 @@ class TokenDashboard:
             "x-cg-demo-api-key": self.coingecko_key,
         }
 
-    def coingecko_top500(self):
-        """Fetch the top 500 coins from Coingecko API and build symbol-to-id mapping."""
+    def coingecko_top500(self, pages=None):
+        """
+        Fetch the top coins from Coingecko API and build symbol-to-id mapping
+
+        All pages are requested concurrently over the shared keep-alive session, the shared rate
+        limiter keeps the burst within the API plan.
+
+        Parameters:
+            pages (int): Number of market pages to fetch (env COINGECKO_PAGES, default 5)
+
+        Returns:
+            list: Processed coin data, ordered by market cap
+        """
         # If we already have the data, return it
         if self.coingecko_data:
             return self.coingecko_data
 
-        URLS = [
-            "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=100&page=1&",
-            "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=100&page=2&",
-            "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=100&page=3&",
-            "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=100&page=4&",
-            "https://api.coingecko.com/api/v3/coins/markets?vs_currency=usd&order=market_cap_desc&per_page=100&page=5&",
-        ]
-
-        params = {"price_change_percentage": "1h,24h,7d,30d"}
-
-        top500_coingecko = []  # Initialize an empty list
+        pages = pages or int(os.getenv("COINGECKO_PAGES", 5))
+        per_page = int(os.getenv("COINGECKO_PER_PAGE", 100))
+        max_workers = int(os.getenv("COINGECKO_MAX_WORKERS", 5))
 
-        for url in URLS:
-            response = requests.get(
-                url,
-                headers=self.headers,
-                params=params,
+        with ThreadPoolExecutor(max_workers=min(max_workers, pages)) as executor:
+            # map() keeps the page order, so the result stays sorted by market cap
+            results = executor.map(
+                lambda page: self._fetch_market_page(page, per_page), range(1, pages + 1)
             )
-            if response.status_code == 200:
-                coingecko_data = response.json()  # Parse JSON object
-
-                for token in coingecko_data:
-                    # Store the symbol to ID mapping as we process the data
-                    self.symbol_to_id_map[token["symbol"].upper()] = token["id"]
-
-                    top500_coingecko.append(
-                        {
-                            "id": token["id"].replace("-", " "),
-                            "symbol": token["symbol"],
-                            "image": token["image"],
-                            "current_price": float(token["current_price"]),
-                            "market_cap_rank": token["market_cap_rank"],
-                            "price_change_percentage_24": (
-                                float(token["price_change_percentage_24h"])
-                                if token.get("price_change_percentage_24h") is not None
-                                else 0.0
-                            ),
-                            "price_change_percentage_1h": (
-                                float(token["price_change_percentage_1h_in_currency"])
-                                if token.get("price_change_percentage_1h_in_currency")
-                                is not None
-                                else 0.0
-                            ),
-                            "price_change_percentage_7d": (
-                                float(token["price_change_percentage_7d_in_currency"])
-                                if token.get("price_change_percentage_7d_in_currency")
-                                is not None
-                                else 0.0
-                            ),
-                            "price_change_percentage_30d": (
-                                float(token["price_change_percentage_30d_in_currency"])
-                                if token.get("price_change_percentage_30d_in_currency")
-                                is not None
-                                else 0.0
-                            ),
-                            "total_volume": float(token["total_volume"]),
-                            "market_cap": float(token["market_cap"]),
-                        }
-                    )
-            else:
-                print(f"Failed to fetch data from {url}")
+            tokens = [token for page_data in results for token in page_data]
+
+        top_coingecko = self._parse_market_tokens(tokens)
 
         self.coingecko_data = (
-            top500_coingecko  # Store the fetched data in the class attribute
+            top_coingecko  # Store the fetched data in the class attribute
         )
-        return top500_coingecko  # Return the processed top500 data
+        return top_coingecko  # Return the processed top coins
+
+    def _fetch_market_page(self, page, per_page):
+        """Fetch one raw page of the markets endpoint, returns an empty list on failure."""
+        url = f"{COINGECKO_API_URL}/coins/markets"
+        params = {
+            "vs_currency": "usd",
+            "order": "market_cap_desc",
+            "per_page": per_page,
+            "page": page,
+            "price_change_percentage": "1h,24h,7d,30d",
+        }
+
+        try:
+            response = coingecko_get(url, self.headers, params)
+        except requests.RequestException as e:
+            logger.warning("Failed to fetch market page", extra={"page": page, "error": str(e)})
+            return []
+
+        if response.status_code != 200:
+            logger.warning("Failed to fetch market page", extra={"page": page, "status": response.status_code})
+            return []
+
+        return response.json()
+
+    def _parse_market_tokens(self, tokens):
+        """Turn raw markets payloads into the row dicts used by the templates, in a single pass."""
+        rows = []
+
+        for token in tokens:
+            # Store the symbol to ID mapping as we process the data. The tokens are in market cap
+            # order and the first one wins, so a duplicated ticker resolves to the highest ranked
+            # coin, like in CoinIndex
+            self.symbol_to_id_map.setdefault(token["symbol"].upper(), token["id"])
+
+            row = {
+                "id": token["id"].replace("-", " "),
+                "symbol": token["symbol"],
+                "image": token["image"],
+                "market_cap_rank": token["market_cap_rank"],
+            }
+            # Missing numbers are reported as null by the API, treat them as 0.0
+            row.update(
+                (field, float(token.get(source) or 0.0))
+                for field, source in MARKET_FLOAT_FIELDS.items()
+            )
+            rows.append(row)
+
+        return rows
 
     def fetch_price_history_by_symbol(self, symbol):
-        """Fetch price history data for a cryptocurrency by symbol"""
-        print(f"Attempting to fetch price history for {symbol}")
+        """Fetch price history data for a cryptocurrency by symbol, as a list of {timestamp, price} dicts"""
+        return series_to_history(*self.fetch_price_series_by_symbol(symbol))
 
-        # Check for existing data
+    def fetch_price_series_by_symbol(self, symbol, max_age_ms=None):
+        """
+        Fetch price history for a cryptocurrency by symbol, as (epoch ms, price) NumPy arrays
+
+        Concurrent calls for the same symbol share one lookup and upstream request, the arrays
+        returned to them are the same objects and must not be modified in place. While another
+        worker process refreshes the symbol, the stored series is returned as is.
+
+        Parameters:
+            symbol (str): Ticker of the cryptocurrency
+            max_age_ms (int): Age of the newest point that triggers a refresh, see fetch_price_series_by_id
+        """
         symbol = symbol.upper()
+        return single_flight(
+            ("history", symbol), lambda: self._fetch_price_series_by_symbol(symbol, max_age_ms)
+        )
+
+    def _fetch_price_series_by_symbol(self, symbol, max_age_ms=None):
+        # Check for existing data
         coin_record = PriceHistory.objects(symbol=symbol).first()
 
         # If we have recent data (last update was less than 1 hour ago), use it
@@ -118,264 +205,349 @@ class TokenDashboard:
             coin_record
             and (datetime.utcnow() - coin_record.last_updated).total_seconds() < 3600
         ):
-            print(f"Using cached data for {symbol}")
-            return coin_record.history
+            logger.debug("Using cached price history", extra={"symbol": symbol})
+            return coin_record.get_series()
 
         # Ensure we have mapping data available
         if not self.symbol_to_id_map and not self.coingecko_data:
-            print("Loading top cryptocurrency data to create symbol-to-id mapping...")
+            logger.info("Loading top cryptocurrency data to create symbol-to-id mapping")
             self.coingecko_top500()  # This will populate self.symbol_to_id_map
 
         # Get the correct coin ID from our mapping
         if symbol in self.symbol_to_id_map:
             coin_id = self.symbol_to_id_map[symbol]
-            print(f"Found coin ID in mapping: {coin_id}")
+            logger.debug("Found coin ID in mapping", extra={"symbol": symbol, "coin_id": coin_id})
         else:
-            print(f"No mapping found for {symbol}, cannot fetch price history")
-            return []
+            logger.warning("No coin ID mapping, cannot fetch price history", extra={"symbol": symbol})
+            return unpack_series(b"", b"")
+
+        # single_flight() covers this process, the lease the other worker processes
+        with get_coordinator().lease(f"history:{symbol}", ttl=60) as acquired:
+            if acquired:
+                # Call the ID-based method to fetch data
+                return self.fetch_price_series_by_id(coin_id, symbol, max_age_ms)
+
+        # Another worker is refreshing this symbol, serve what is stored until it is done
+        return coin_record.get_series() if coin_record else unpack_series(b"", b"")
+
+    def fetch_rollup_by_symbol(self, symbol, resolution):
+        """
+        Fetch one stored resolution of a cryptocurrency's price history
 
-        # Call the ID-based method to fetch data
-        return self.fetch_price_history_by_id(coin_id, symbol)
+        Parameters:
+            symbol (str): Ticker of the cryptocurrency
+            resolution (str): "1h", "4h", "1d" (OHLC rows) or "sparkline" (t, p rows)
+
+        Returns:
+            ndarray: float64 matrix, see series.compute_rollups
+        """
+        symbol = symbol.upper()
+        max_age_ms = rollup_max_age_ms(resolution)
+        coin_record = PriceHistory.objects(symbol=symbol).only("rollups", "last_timestamp").first()
+
+        if (
+            not coin_record
+            or coin_record.last_timestamp is None
+            or time.time() * 1000 - coin_record.last_timestamp >= max_age_ms
+            or resolution not in (coin_record.rollups or {})
+        ):
+            # Missing or stale, refresh the series (this stores the rollups) and read them again
+            self.fetch_price_series_by_symbol(symbol, max_age_ms)
+            coin_record = PriceHistory.objects(symbol=symbol).only("rollups").first()
+            if not coin_record:
+                return unpack_rollup(b"", resolution)
+            if resolution not in (coin_record.rollups or {}):
+                # Stored before rollups existed and not refreshed, bucket the raw series
+                coin_record = PriceHistory.objects(symbol=symbol).first()
+
+        return coin_record.get_rollup(resolution)
 
     def fetch_price_history_by_id(self, coin_id, symbol):
         """
-        Fetch 7-day price history data using the coin's ID directly
-        Only updates if latest data point is more than 4 hours old
+        Fetch price history data using the coin's ID directly
+
+        Returns:
+            list: Processed price history data as {timestamp, price} dicts
+        """
+        return series_to_history(*self.fetch_price_series_by_id(coin_id, symbol))
+
+    def fetch_price_series_by_id(self, coin_id, symbol, max_age_ms=None):
+        """
+        Fetch price history data using the coin's ID directly
+        Only updates if latest data point is more than max_age_ms (default HISTORY_REFRESH_HOURS, 4 hours) old
+
+        Only the window after the last stored point is requested from the range endpoint and
+        merged into the stored series. The write is conditional on the last timestamp we read,
+        so two concurrent refreshes cannot overwrite each other.
 
         Parameters:
             coin_id (str): CoinGecko ID of the cryptocurrency
             symbol (str): Symbol for database storage and reference
+            max_age_ms (int): Age of the newest point from which the series is refreshed
+
+        Returns:
+            tuple: (timestamps in epoch ms, prices) NumPy arrays, the stored ones when the request failed
+        """
+        timestamps, prices, _ = self.refresh_price_series_by_id(coin_id, symbol, max_age_ms)
+        return timestamps, prices
+
+    def refresh_price_series_by_id(self, coin_id, symbol, max_age_ms=None):
+        """
+        Same as fetch_price_series_by_id, but also reports whether the series is up to date
 
         Returns:
-            list: Processed price history data
+            tuple: (timestamps, prices, fresh), fresh is False when the refresh failed and the
+            arrays are what was stored before
         """
-        print(f"Fetching price history for {coin_id} ({symbol})")
+        logger.debug("Fetching price history", extra={"symbol": symbol, "coin_id": coin_id})
 
         # Check for existing data
         symbol = symbol.upper()
         coin_record = PriceHistory.objects(symbol=symbol).first()
+        timestamps, prices = coin_record.get_series() if coin_record else unpack_series(b"", b"")
 
-        # Check if we have recent data (less than 4 hours old)
-        if coin_record and coin_record.history:
-            latest_timestamp = max(entry["timestamp"] for entry in coin_record.history)
-            time_diff = (
-                datetime.utcnow() - latest_timestamp
-            ).total_seconds() / 3600  # hours
+        last_timestamp = coin_record.last_timestamp if coin_record else None
+        if last_timestamp is None and len(timestamps):
+            last_timestamp = int(timestamps.max())  # Record written before last_timestamp existed
 
-            if time_diff < 4:
-                print(
-                    f"Using fresh data for {symbol} (latest point is {time_diff:.1f} hours old)"
-                )
-                return coin_record.history
+        now_ms = int(time.time() * 1000)
+        retention_ms = HISTORY_RETENTION_DAYS * 86_400_000
+
+        # Check if we have recent data (less than max_age_ms old)
+        if max_age_ms is None:
+            max_age_ms = HISTORY_REFRESH_HOURS * 3_600_000
+        if last_timestamp is not None:
+            time_diff = (now_ms - last_timestamp) / 3_600_000  # hours
+
+            if now_ms - last_timestamp < max_age_ms:
+                logger.debug("Using fresh price history", extra={"symbol": symbol, "age_hours": round(time_diff, 1)})
+                return timestamps, prices, True
             else:
-                print(f"Data for {symbol} is {time_diff:.1f} hours old, updating...")
+                logger.debug("Price history is stale, fetching the missing window", extra={"symbol": symbol, "age_hours": round(time_diff, 1)})
 
-        # Fetch new data from API
-        url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart?vs_currency=usd&days=7"
-        print(f"Requesting data from: {url}")
+        # Fetch only the missing window from the API
+        window_start = max(last_timestamp or 0, now_ms - retention_ms)
+        url = f"{COINGECKO_API_URL}/coins/{coin_id}/market_chart/range"
+        params = {"vs_currency": "usd", "from": window_start // 1000, "to": now_ms // 1000}
 
         try:
-            response = requests.get(url, headers=self.headers)
-            print(f"API response status: {response.status_code}")
-
+            response = coingecko_get(url, self.headers, params)
             if response.status_code != 200:
-                print(f"API request failed: {response.text}")
-                return (
-                    coin_record.history if coin_record and coin_record.history else []
-                )
-
-            price_data = response.json().get("prices", [])
-            print(f"Retrieved {len(price_data)} data points from API")
+                logger.warning("Price history request failed", extra={"coin_id": coin_id, "status": response.status_code})
+                return timestamps, prices, False
 
-            # Sample every 4 hours for efficiency
-            processed_data = []
-            for i in range(0, len(price_data), 4):
-                if i < len(price_data):
-                    timestamp_ms, price = price_data[i]
-                    timestamp = datetime.fromtimestamp(timestamp_ms / 1000)
-                    processed_data.append({"timestamp": timestamp, "price": price})
+            price_data = np.asarray(response.json().get("prices", []), dtype=np.float64).reshape(-1, 2)
+            logger.debug("Retrieved price points", extra={"coin_id": coin_id, "points": len(price_data)})
 
-            print(f"Processed {len(processed_data)} data points")
+            merged_timestamps, merged_prices = merge_series(
+                timestamps, prices,
+                price_data[:, 0].astype(np.int64), price_data[:, 1],
+                retention_ms, now_ms,
+            )
+            logger.debug("Merged price history", extra={"symbol": symbol, "points": len(merged_prices), "added": len(merged_prices) - len(prices)})
 
             # Save to database
             if coin_record:
-                if time_diff >= 4 and coin_record.history:
-                    # If data is stale, remove the last point and append new data
-                    coin_record.history = coin_record.history[:-1] + processed_data[-1:]
-                    print(f"Updated last data point for {symbol}")
-                else:
-                    coin_record.history = processed_data
-                    print(f"Replaced all data points for {symbol}")
-
-                coin_record.last_updated = datetime.utcnow()
-                coin_record.save()
+                packed_timestamps, packed_prices = pack_series(merged_timestamps, merged_prices)
+                updated = PriceHistory.objects(
+                    id=coin_record.id, last_timestamp=coin_record.last_timestamp
+                ).update_one(
+                    set__timestamps=packed_timestamps,
+                    set__prices=packed_prices,
+                    set__point_count=len(merged_prices),
+                    set__last_timestamp=int(merged_timestamps[-1]) if len(merged_timestamps) else None,
+                    set__rollups=compute_rollups(merged_timestamps, merged_prices, SPARKLINE_POINTS),
+                    set__history=[],
+                    set__last_updated=datetime.utcnow(),
+                )
+
+                if not updated:
+                    # Another refresh stored this symbol first, its result is at least as new
+                    logger.info("Concurrent price history update, using the stored series", extra={"symbol": symbol})
+                    return (*PriceHistory.objects(symbol=symbol).first().get_series(), True)
             else:
                 new_record = PriceHistory(
                     symbol=symbol,
                     name=coin_id,
-                    history=processed_data,
                     last_updated=datetime.utcnow(),
                 )
+                new_record.set_series(merged_timestamps, merged_prices)
                 new_record.save()
-                print(f"Created new record for {symbol}")
+                logger.debug("Created price history record", extra={"symbol": symbol})
+
+            return merged_timestamps, merged_prices, True
+
+        except Exception:
+            logger.exception("Error fetching price data", extra={"coin_id": coin_id})
+            return timestamps, prices, False
+
+    def fetch_categories_by_id(self, coin_id):
+        """
+        Fetch the CoinGecko categories (sectors) of one coin
 
-            return coin_record.history if coin_record else processed_data
+        The coin endpoint takes a single id, the other sections of its payload are switched off.
 
-        except Exception as e:
-            print(f"Error fetching price data for {coin_id}: {str(e)}")
-            return coin_record.history if coin_record and coin_record.history else []
+        Returns:
+            list: Category names, or None when the request failed
+        """
+        url = f"{COINGECKO_API_URL}/coins/{coin_id}"
+        params = {
+            "localization": "false",
+            "tickers": "false",
+            "market_data": "false",
+            "community_data": "false",
+            "developer_data": "false",
+            "sparkline": "false",
+        }
+
+        try:
+            response = coingecko_get(url, self.headers, params)
+        except requests.RequestException as e:
+            logger.warning("Failed to fetch categories", extra={"coin_id": coin_id, "error": str(e)})
+            return None
+
+        if response.status_code == 404:
+            return []  # Unknown id, nothing to retry
+        if response.status_code != 200:
+            logger.warning("Failed to fetch categories", extra={"coin_id": coin_id, "status": response.status_code})
+            return None
+
+        return [category for category in response.json().get("categories") or [] if category]
 
-    def initialize_price_history_data(self, limit=10):
+    def initialize_price_history_data(self, limit=10, workers=None, state_file=None):
         """Initialize price history data for top cryptocurrencies
 
         This is useful for initial setup and can be run as a background task.
-        By default, only initializes data for top 10 cryptocurrencies to avoid rate limiting.
+        Histories are fetched concurrently, the shared rate limiter keeps the requests within
+        the API plan and backs off on 429 responses. When a state file is given, completed
+        symbols are recorded in it and skipped when the run is resumed.
+
+        Parameters:
+            limit (int): Number of top cryptocurrencies to backfill
+            workers (int): Concurrent fetches (env BACKFILL_WORKERS, default 8)
+            state_file (str): Optional JSON file holding the progress of the run
+
+        Returns:
+            tuple: (successful, failed)
         """
-        print(f"Starting data collection for top {limit} cryptocurrencies...")
+        logger.info("Starting price history backfill", extra={"limit": limit})
+        workers = workers or int(os.getenv("BACKFILL_WORKERS", 8))
 
         # First ensure we have top cryptocurrency data
         if not self.coingecko_data:
-            print("Loading top cryptocurrency data...")
-            self.coingecko_top500()
-
-        # Get top cryptocurrencies
-        top_coins = self.coingecko_data[:limit]
+            logger.info("Loading top cryptocurrency data")
+            self.coingecko_top500(pages=max(1, -(-limit // int(os.getenv("COINGECKO_PER_PAGE", 100)))))
+
+        # Resume: skip what a previous run already stored
+        completed = set()
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as f:
+                completed = set(json.load(f).get("completed", []))
+            logger.info("Resuming backfill", extra={"completed": len(completed)})
+
+        # Duplicated tickers map to one coin id, so each ticker is backfilled once
+        symbols = []
+        for coin in self.coingecko_data[:limit]:
+            symbol = coin["symbol"].upper()
+            if symbol not in completed and symbol in self.symbol_to_id_map and symbol not in symbols:
+                symbols.append(symbol)
 
         # Track metrics
         successful = 0
         failed = 0
+        lock = threading.Lock()
+        started = time.time()
+        throttled_before = coingecko_limiter.throttled
 
-        # Process each coin
-        for index, coin in enumerate(top_coins):
+        def backfill(symbol):
+            coin_id = self.symbol_to_id_map[symbol]
             try:
-                coin_id = coin["id"]
-                symbol = coin["symbol"].upper()
-
-                print(f"Processing {index + 1}/{limit}: {symbol} (ID: {coin_id})")
-
-                # Use the ID-based method for more reliable API calls
-                result = self.fetch_price_history_by_id(coin_id, symbol)
+                # A failed request falls back to the stored series, only a refresh counts as done
+                _, _, fresh = self.refresh_price_series_by_id(coin_id, symbol)
+                return fresh
+            except Exception:
+                logger.exception("Error processing coin", extra={"coin_id": coin_id})
+                return False
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(backfill, symbol): symbol for symbol in symbols}
+
+            for future in as_completed(futures):
+                symbol = futures[future]
+                with lock:
+                    if future.result():
+                        successful += 1
+                        completed.add(symbol)
+                        if state_file:
+                            self._save_backfill_state(state_file, completed)
+                    else:
+                        failed += 1
+
+                    done = successful + failed
+                    if done % 25 == 0 or done == len(symbols):
+                        elapsed = time.time() - started
+                        logger.info("Backfill progress", extra={"done": done, "total": len(symbols), "coins_per_second": round(done / elapsed, 1)})
+
+        elapsed = time.time() - started
+        logger.info(
+            "Price history backfill completed",
+            extra={
+                "elapsed_seconds": round(elapsed, 1),
+                "successful": successful,
+                "failed": failed,
+                "rate_limited": coingecko_limiter.throttled - throttled_before,
+            },
+        )
+        return successful, failed
 
-                if result:
-                    successful += 1
-                else:
-                    failed += 1
+    @staticmethod
+    def _save_backfill_state(state_file, completed):
+        # Write to a temp file first so a crash never leaves a truncated state file
+        tmp_file = f"{state_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"completed": sorted(completed), "updated_at": datetime.utcnow().isoformat()}, f)
+        os.replace(tmp_file, state_file)
 
-                # Avoid rate limiting
-                time.sleep(1)
+    def plot_7d_chart(self, limit=50, fmt="png"):
+        """
+        Render the 7d thumbnail charts of the top coins from their stored price histories
 
-            except Exception as e:
-                failed += 1
-                print(f"Error processing {coin.get('id', 'unknown')}: {str(e)}")
+        Charts are drawn by the sparkline renderer straight into memory at display size,
+        nothing touches the disk.
 
-        print(f"Data collection completed: {successful} successful, {failed} failed")
-        return successful, failed
+        Parameters:
+            limit (int): Number of top coins (by market cap) to render
+            fmt (str): "png" or "svg"
 
-    def plot_7d_chart(self, limit=50):
+        Returns:
+            dict: Symbol -> encoded image bytes
         """
-        This method works fine, but for trouble shooting purposes, we will limit to 50 plots
-        We will also have to implement threading/background running in order to not slow the website down by 50x
+        # Imported here so importing utils (e.g. by the web workers) does not load the renderer
+        from sparkline import render_sparkline
 
-        Also the charts are being made properly, but they might be getting fucked because of the buffer (buffer should be able to handle 500 charts, but it maybe causing loading issues on the server side)
-        """
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client["crypto_tracker"]
-        collection = db["price_history"]
-        history_docs = collection.find().limit(limit)
         plot_data = {}
 
-        for doc in history_docs:
-            ticker = doc["symbol"]
-            prices = []
-            timestamps = []
-
-            for x in doc["history"]:
-                # print(f"({ticker}):", x["timestamp"])  # Reduce decimals except for currencies under $1 (TODO, will implement this later on)
-                prices.append(x["price"])
-                timestamps.append(x["timestamp"])
-
-            plt.figure(figsize=(10, 5))
-
-            # Change colors based on upward or downward chart
-            if prices[0] > prices[-1]:
-                color = "#EF4444"
-            elif prices[0] < prices[-1]:
-                color = "#10B981"
+        for ticker, timestamps, prices in iter_sparklines(top_symbols(self.coingecko_top500(), limit)):
+            image_data = render_sparkline(prices.tolist(), (timestamps / 1000).tolist(), fmt=fmt)
+            if image_data:
+                plot_data[ticker] = image_data
             else:
-                color = "#D3D3D3"  # Neutral (light grey)  # When working with multiple decimals, this kinda becomes useless, this is just in case
-
-            lineplot = sns.lineplot(x=timestamps, y=prices, color=color)
-            plt.fill_between(timestamps, prices, color=color, alpha=0.2)
-
-            # Calculation to setup appropriate y-axis limits (chart centering)
-            max_price = max(prices)
-            min_price = min(prices)
-            price_range = max_price - min_price
-            padding = price_range * 0.2
-            y_min = max(0, min_price - padding)
-            y_max = max_price + padding
-            plt.ylim(y_min, y_max)
-
-            lineplot.set_xticks([])
-            lineplot.set_yticks([])
-            lineplot.set_xticklabels([])
-            lineplot.set_yticklabels([])
+                logger.debug("Not enough price data to chart", extra={"symbol": ticker})
 
-            for spine in lineplot.spines.values():
-                spine.set_visible(False)
-
-            lineplot.grid(False)
-            lineplot.set_title(False)
-            plt.tight_layout()
-            plt.subplots_adjust(left=0, right=1, top=1, bottom=0)
-
-            filename = f"temp_chart_{ticker}.png"
-            plt.savefig(filename, format="png", dpi=300)
-            plt.close()
-
-            with open(filename, "rb") as f:
-                image_data = f.read()
-
-                if image_data[:8] == b'\x89PNG\r\n\x1a\n':
-                    print(f"Valid PNG data for {ticker}")
-                    plot_data[ticker] = image_data
-                else:
-                    print(f"Invalid PNG data for {ticker}")
-
-            os.remove(filename)
-
-        client.close() # Remove the temporary file
+        logger.info("Rendered charts", extra={"count": len(plot_data)})
         return plot_data
 
-    def store_charts_in_mongodb(self, chart_data):
-        """Storing the results from plot_7d_chart method in mongodb collection"""
-        client = MongoClient("mongodb://localhost:27017/")
-        db = client["crypto_tracker"]
-        collection = db["price_history"]
-
-        success_count = 0
-
-        for ticker, image_data in chart_data.items():
-            result = collection.update_one(
-                {"symbol": ticker.upper()},
-                {
-                    "$set": {
-                        "chart_image": image_data,
-                        "chart_updated_at": datetime.utcnow()
-                    }
-                }
-            )
-            if result.matched_count > 0:
-                success_count += 1
-                print(f"Successfully stored {ticker} chart")
-            else:
-                print(f"No docs found for {ticker}")
-
-        print(f"{success_count} charts stored")
-        client.close()
-        return success_count
+    def store_charts_in_mongodb(self, chart_data, digests=None):
+        """
+        Storing the results from plot_7d_chart method in the chart store
 
+        Images go to the `charts` GridFS bucket, not into the price_history documents.
 
+        Parameters:
+            chart_data (dict): Symbol -> encoded image bytes
+            digests (dict): Optional symbol -> digest of the history each chart was drawn from
 
-# Run tests here
-ds = TokenDashboard()
+        Returns:
+            int: Number of charts stored
+        """
+        return get_chart_store().put_many(chart_data, digests)